@@ -2,14 +2,30 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import os
-import matplotlib.pyplot as plt
 import plotly.express as px
 
+from rank_table import build_rank_table, leaderboard_orders, RANK_TABLE_PATH
+from app_bundle import add_display_names, read_app_bundle, BUNDLE_DIR
+from projection_service import ProjectionService
+from projection_charts import group_by_player, projection_figure
+
 # Get the directory where the script is located
 script_dir = os.path.dirname(os.path.abspath(__file__))
 
-@st.cache_data
+# Loaders backed by the bundle are cached as resources: st.cache_data would pickle their frames and hand every
+# rerun a deserialized copy, defeating the memory mapping. The returned objects are shared, so treat them as read-only
+
+@st.cache_resource
+def load_bundle():
+    # Memory-mapped tables written by main.py, or None if there is no current bundle
+    return read_app_bundle(os.path.join(script_dir, BUNDLE_DIR))
+
+@st.cache_resource
 def load_data():
+    bundle = load_bundle()
+    if bundle is not None:
+        return bundle["candidates"], bundle["historic"], bundle["regression"]
+
     # Construct full paths to the CSV files
     bc_csv_path = os.path.join(script_dir, "breakout_candidate_metrics.csv")
     hist_csv_path = os.path.join(script_dir, "historic_projected_breakouts.csv")
@@ -21,17 +37,70 @@ def load_data():
     projections_reg = pd.read_csv(reg_csv_path)
 
     # Clean up names to First Last format
-    candidates['first_last_name'] = candidates['last_name, first_name'].apply(lambda x: " ".join(x.split(", ")[::-1]))
-    projections_hist['first_last_name'] = projections_hist['last_name, first_name'].apply(lambda x: " ".join(x.split(", ")[::-1]))
-    projections_reg['first_last_name'] = projections_reg['last_name, first_name'].apply(lambda x: " ".join(x.split(", ")[::-1]))
-    projections_hist['match_name'] = projections_hist['match_name'].apply(lambda x: " ".join(x.split(", ")[::-1]))
+    return add_display_names(candidates), add_display_names(projections_hist), add_display_names(projections_reg)
+
+@st.cache_resource
+def load_rank_index():
+    # Precomputed by main.py; rebuilt here only if the pipeline has not written it yet
+    bundle = load_bundle()
+    rank_csv_path = os.path.join(script_dir, RANK_TABLE_PATH)
+    if bundle is not None:
+        rank_table = bundle["ranks"]
+    elif os.path.exists(rank_csv_path):
+        rank_table = pd.read_csv(rank_csv_path)
+    else:
+        rank_table = build_rank_table(load_data()[0])
+
+    # Name -> candidate row, leaderboard orders and the dropdown list, so reruns only do lookups
+    name_index = dict(zip(rank_table['first_last_name'], rank_table['row']))
+    sorted_names = rank_table['first_last_name'].sort_values(ascending=False).tolist()
+    return rank_table, name_index, leaderboard_orders(rank_table), sorted_names
+
+@st.cache_resource
+def load_projection_service():
+    # Built on first use only; projects players the pipeline did not precompute
+    return ProjectionService.from_artifacts(os.path.join(script_dir, "batting.csv"))
 
-    return candidates, projections_hist, projections_reg
+@st.cache_data
+def load_player_directory():
+    # "First Last" -> player_id for every player in the batting data, sorted by name
+    players = load_projection_service().full_data.drop_duplicates(subset='player_id', keep='last')
+    players = add_display_names(players).sort_values(by='first_last_name')
+    return dict(zip(players['first_last_name'], players['player_id']))
+
+@st.cache_resource
+def load_projection_groups():
+    # Historical and regression projections split by player once, so each selection is a dict lookup
+    _, projections_hist, projections_reg = load_data()
+    return group_by_player(projections_hist), group_by_player(projections_reg)
+
+def lazy_projection(candidate):
+    # Precomputed rows when the pipeline projected the candidate (a comp may lack a regression trend),
+    # otherwise projected on demand (and cached by the service)
+    hist_groups, reg_groups = load_projection_groups()
+    name = candidate['last_name, first_name']
+    if name in hist_groups:
+        return hist_groups[name], reg_groups.get(name, pd.DataFrame())
+    hist_proj, reg_proj = load_projection_service().project_candidate(candidate)
+    return add_display_names(hist_proj), add_display_names(reg_proj)
 
-candidates_df, hist_proj_df, reg_proj_df = load_data()
+@st.cache_data
+def load_projection_chart(selected_row):
+    # Built once per candidate; metric and projection type are switched in the browser
+    candidate = load_data()[0].iloc[selected_row]
+    hist_proj, reg_proj = lazy_projection(candidate)
+    return projection_figure({"Historical": hist_proj, "Regression": reg_proj}, candidate['first_last_name'])
 
-# Create a mapping from first_last_name to last_name, first_name
-name_map = dict(zip(candidates_df['first_last_name'], candidates_df['last_name, first_name']))
+@st.cache_data
+def load_player_chart(player_id, first_last):
+    # Comp name and chart for any player in the batting data, built once per player
+    hist_proj, reg_proj = load_projection_service().project_player(player_id)
+    hist_proj, reg_proj = add_display_names(hist_proj), add_display_names(reg_proj)
+    match_name = hist_proj['match_first_last_name'].iloc[0] if not hist_proj.empty else None
+    return match_name, projection_figure({"Historical": hist_proj, "Regression": reg_proj}, first_last)
+
+candidates_df = load_data()[0]
+rank_table, name_index, leaderboards, sorted_names = load_rank_index()
 
 # Streamlit UI
 st.title("MLB Breakout Candidates Viewer")
@@ -70,13 +139,6 @@ fig = px.scatter(
 )
 st.plotly_chart(fig, use_container_width=True)
 
-# Sort players by breakout score (highest first)
-sorted_candidates = candidates_df.sort_values(by='first_last_name', ascending=False)
-sorted_names = sorted_candidates['first_last_name'].tolist()
-
-# Update name map for consistent lookups
-name_map = dict(zip(sorted_candidates['first_last_name'], sorted_candidates['last_name, first_name']))
-
 # Display dropdown sorted by first name
 selected_first_last = st.selectbox(
     "Select a breakout candidate:",
@@ -85,40 +147,21 @@ selected_first_last = st.selectbox(
 )
 
 # Convert back to original name format for filtering
-selected_name = name_map[selected_first_last]
+selected_row = name_index[selected_first_last]
+selected_name = candidates_df['last_name, first_name'].iat[selected_row]
 
 # Display Key Stats
 st.subheader("Key Statcast Metrics")
-metrics_to_show = {
-    'breakout_score': 'Breakout Score',
-    'superstar_similarity': 'Similarity Similarity',
-    'exit_velocity_avg': 'Avg Exit Velocity (mph)',
-    'launch_angle_avg': 'Avg Launch Angle (°)',
-    'barrel_batted_rate': 'Barrel Rate (%)',
-    'hard_hit_percent': 'Hard Hit %',
-    'xwoba': 'xwOBA',
-    'xba': 'xBA',
-    'xslg': 'xSLG'
-}
 
-player_row = candidates_df[candidates_df['last_name, first_name'] == selected_name]
+player_row = candidates_df.iloc[[selected_row]]
 
 if not player_row.empty:
 
-    player_index = player_row.index[0]
-
     # Breakout/Similarity/Index rank
-    breakout_sorted = candidates_df.sort_values(by='breakout_score', ascending=False).reset_index()
-    breakout_rank = breakout_sorted[breakout_sorted['last_name, first_name'] == selected_name].index[0] + 1
-    breakout_total = len(breakout_sorted)
-
-    similarity_sorted = candidates_df.sort_values(by='superstar_similarity', ascending=False).reset_index()
-    similarity_rank = similarity_sorted[similarity_sorted['last_name, first_name'] == selected_name].index[0] + 1
-    similarity_total = len(similarity_sorted)
-
-    index_sorted = candidates_df.sort_values(by='breakout_index', ascending=False).reset_index()
-    index_rank = index_sorted[similarity_sorted['last_name, first_name'] == selected_name].index[0] + 1
-    index_total = len(index_sorted)
+    breakout_rank = rank_table['breakout_score_rank'].iat[selected_row]
+    similarity_rank = rank_table['superstar_similarity_rank'].iat[selected_row]
+    index_rank = rank_table['breakout_index_rank'].iat[selected_row]
+    breakout_total = similarity_total = index_total = len(rank_table)
 
     # Row 1: 4 metrics
     row1 = st.columns(4)
@@ -160,9 +203,9 @@ else:
 st.subheader("Comparison Player & Projection Context")
 
 # Pull comparison match name from projections
-match_row = hist_proj_df[hist_proj_df['first_last_name'] == selected_first_last]
+match_row, _ = lazy_projection(candidates_df.iloc[selected_row])
 if not match_row.empty:
-    match_name = match_row['match_name'].iloc[0]
+    match_name = match_row['match_first_last_name'].iloc[0]
     st.markdown(f"""
     **Historical Comparison:** {match_name}  
     This projection assumes that **{selected_first_last}** progresses similarly to how **{match_name}** did **OFFENSIVELY** over their career.  
@@ -172,34 +215,30 @@ else:
     st.warning("No comparison player found for this candidate.")
 
 
-# Projection Chart
+# Projection Chart: pick the stat from the chart's dropdown, click a legend entry to hide a projection type
 st.subheader("Stat Projection Over Time")
-proj_type = st.radio("Select projection type:", ["Historical", "Regression"], horizontal=True)
-proj_df = hist_proj_df if proj_type == "Historical" else reg_proj_df
-player_proj = proj_df[proj_df['last_name, first_name'] == selected_name]
-
-# Display name to internal stat mapping, excluding breakout and similarity scores
-display_to_stat = {
-    v: k for k, v in metrics_to_show.items()
-    if k not in ['breakout_score', 'superstar_similarity']
-}
-
-# Stat options for dropdown
-stat_display = st.selectbox("Select a stat to plot:", list(display_to_stat.keys()), key="stat_selector")
-stat_to_plot = display_to_stat[stat_display]
-
-if not player_proj.empty:
-    fig, ax = plt.subplots()
-    ax.plot(player_proj['year'], player_proj[stat_to_plot], marker='o')
-    ax.set_title(f"{stat_display} Projection for {selected_first_last}")
-    ax.set_xlabel("Year")
-    ax.set_ylabel(stat_display)
-    ax.grid(True)
-    st.pyplot(fig)
+projection_chart = load_projection_chart(selected_row)
+if projection_chart is not None:
+    st.plotly_chart(projection_chart, use_container_width=True)
 else:
     st.warning("No projection data available for this player.")
 
 
+# On-demand projection for any player in the batting data, not just precomputed candidates
+st.subheader("Project Any Player")
+if st.checkbox("Look up any player", key="any_player_lookup"):
+    player_ids = load_player_directory()
+    lookup_first_last = st.selectbox("Select a player:", list(player_ids), key="any_player_dropdown")
+
+    lookup_match, lookup_chart = load_player_chart(player_ids[lookup_first_last], lookup_first_last)
+    if lookup_chart is not None:
+        if lookup_match is not None:
+            st.markdown(f"**Historical Comparison:** {lookup_match}")
+        st.plotly_chart(lookup_chart, use_container_width=True)
+    else:
+        st.warning("No historical comp found for this player.")
+
+
 # Define keys for a stat based leaderboard
 stat_buttons = {
     "Breakout Score": "breakout_score",
@@ -240,9 +279,8 @@ if "selected_leaderboard_stat" not in st.session_state:
 selected_stat = st.session_state.selected_leaderboard_stat
 selected_label = st.session_state.selected_label
 
-# Compute proper rankings using rank()
-candidates_df['rank'] = candidates_df[selected_stat].rank(method="min", ascending=False)
-candidates_df_sorted = candidates_df.sort_values(by=selected_stat, ascending=False)
+# Rows in precomputed rank order
+candidates_df_sorted = candidates_df.iloc[leaderboards[selected_stat]]
 
 
 st.markdown(f"#### Top Players by **{selected_label}**")
@@ -0,0 +1,92 @@
+import json
+import os
+import shutil
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from data_loader import to_first_last
+
+BUNDLE_DIR = "app_bundle"
+
+# Where --stream runs write the projection tables block by block before they are moved into the bundle
+STREAM_DIR = BUNDLE_DIR + ".stream"
+
+# Bumped whenever a table's columns change, so the app falls back to the CSVs instead of misreading an old bundle
+BUNDLE_VERSION = 1
+
+BUNDLE_TABLES = ("candidates", "historic", "regression", "ranks")
+
+
+def add_display_names(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns a copy of a pipeline output with "First Last" display names: first_last_name for the player and, when the
+    frame has a comp, match_first_last_name.
+    """
+    df = df.copy()
+    if df.empty:
+        return df
+    df["first_last_name"] = to_first_last(df["last_name, first_name"])
+    if "match_name" in df.columns:
+        df["match_first_last_name"] = to_first_last(df["match_name"])
+    return df
+
+
+def write_app_bundle(scored_df: pd.DataFrame, hist_proj_df: pd.DataFrame, reg_proj_df: pd.DataFrame,
+                     rank_table: pd.DataFrame, bundle_dir: str = BUNDLE_DIR, streamed_dir: str = None) -> None:
+    """
+    Writes everything the Streamlit app reads as uncompressed Arrow IPC (Feather v2) files, one per table, with display
+    names already added, so the app can memory-map them instead of parsing CSVs.
+    With streamed_dir, the projection tables are taken from the historic.arrow and regression.arrow files that
+    projection_writer.stream_projections wrote there (hist_proj_df and reg_proj_df may then be None); the files are
+    moved into the bundle rather than read back, and a table with no streamed rows is written empty.
+    The bundle is built in a temporary directory and swapped in whole, so the app never sees a half-written bundle.
+    """
+    tables = {
+        "candidates": add_display_names(scored_df),
+        "historic": None if streamed_dir else add_display_names(hist_proj_df),
+        "regression": None if streamed_dir else add_display_names(reg_proj_df),
+        "ranks": rank_table,
+    }
+
+    tmp_dir = bundle_dir.rstrip(os.sep) + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    rows = {}
+    for name, df in tables.items():
+        path = os.path.join(tmp_dir, f"{name}.arrow")
+        streamed_path = os.path.join(streamed_dir, f"{name}.arrow") if df is None else None
+        if streamed_path and os.path.exists(streamed_path):
+            os.replace(streamed_path, path)
+            rows[name] = feather.read_table(path, memory_map=True).num_rows
+            continue
+        df = pd.DataFrame() if df is None else df
+        table = pa.Table.from_pandas(df.reset_index(drop=True), preserve_index=False)
+        feather.write_feather(table, path, compression="uncompressed")
+        rows[name] = len(df)
+    with open(os.path.join(tmp_dir, "manifest.json"), "w") as f:
+        json.dump({"version": BUNDLE_VERSION, "rows": rows}, f)
+    if streamed_dir:
+        shutil.rmtree(streamed_dir, ignore_errors=True)
+
+    shutil.rmtree(bundle_dir, ignore_errors=True)
+    os.replace(tmp_dir, bundle_dir)
+
+
+def read_app_bundle(bundle_dir: str = BUNDLE_DIR) -> dict:
+    """
+    Memory-maps every table of a bundle written by write_app_bundle into a DataFrame.
+    Returns None if there is no bundle or it was written by a different BUNDLE_VERSION.
+    """
+    manifest_path = os.path.join(bundle_dir, "manifest.json")
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        if json.load(f).get("version") != BUNDLE_VERSION:
+            return None
+
+    return {
+        name: feather.read_table(os.path.join(bundle_dir, f"{name}.arrow"), memory_map=True).to_pandas(split_blocks=True)
+        for name in BUNDLE_TABLES
+    }
@@ -0,0 +1,202 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import pandas as pd
+import numpy as np
+
+from data_loader import load_local_batting_data, METRICS
+from candidate_filter import filter_breakout_candidates
+from weighted_metrics import calculate_weighted_averages
+from projections import match_and_project, build_projection_reference
+from trajectories import CareerTrajectories
+
+# Projection methods scored by the backtest; persistence (the candidate's weighted averages carried forward) is the
+# naive baseline the other two have to beat
+METHODS = ['historical', 'regression', 'persistence']
+
+HORIZON = 4
+
+# Seasons of data a cutoff needs before it, so build_projection_reference can find players with its 4 seasons
+MIN_HISTORY_SEASONS = 4
+
+# The batting data, set once per worker process by share_batting_data
+WORKER_DATA = {}
+
+
+def default_cutoffs(full_data: pd.DataFrame) -> list:
+    """
+    Every season that has MIN_HISTORY_SEASONS seasons of data before it and at least one realized season after it.
+    """
+    years = full_data["year"]
+    return list(range(int(years.min()) + MIN_HISTORY_SEASONS, int(years.max())))
+
+
+def cutoff_weighting(cutoff: int, weighting: dict = None) -> dict:
+    """
+    calculate_weighted_averages arguments for a run whose latest season is cutoff: the pipeline's 0.4/0.6 weights moved
+    to the two seasons ending at cutoff, or the given half-life weighting, which decays from each player's last season
+    up to cutoff as in main.py.
+    """
+    weighting = dict(weighting or {})
+    if weighting.get("half_life") is None:
+        weighting.pop("half_life", None)
+        weighting.pop("n_seasons", None)
+        weighting["season_weights"] = {cutoff - 1: 0.4, cutoff: 0.6}
+    return weighting
+
+
+def run_cutoff(cutoff: int, full_data: pd.DataFrame, weighting: dict = None) -> pd.DataFrame:
+    """
+    Replays the pipeline as if cutoff were the latest season, using only seasons up to cutoff: candidates are players
+    who debuted in the last two seasons, comps come from the reference pool before cutoff and projections cover the
+    4 seasons after it. Each projection is paired with the season the player actually had, where there is one.
+    Returns one row per (method, player, projected season, metric) with the projected and realized values.
+    """
+    history = full_data[full_data["year"] <= cutoff]
+    candidates_df = filter_breakout_candidates(history, min_debut_year=cutoff - 1)
+    weighted_df = calculate_weighted_averages(candidates_df, **cutoff_weighting(cutoff, weighting))
+    reference_df = build_projection_reference(history, before_year=cutoff)
+    if weighted_df.empty or reference_df.empty:
+        return pd.DataFrame(columns=["cutoff", "method", "player_id", "year", "horizon", "metric", "projected", "actual"])
+
+    trajectories = CareerTrajectories.from_history(history, player_ids=reference_df["player_id"].unique())
+    hist_proj_df, reg_proj_df = match_and_project(weighted_df, reference_df, history, trajectories=trajectories,
+                                                  first_year=cutoff + 1)
+
+    persistence_df = weighted_df.loc[weighted_df.index.repeat(HORIZON), ["last_name, first_name"] + METRICS]
+    persistence_df.insert(1, "year", np.tile(np.arange(cutoff + 1, cutoff + 1 + HORIZON), len(weighted_df)))
+
+    # Projections are labelled by name; names shared by two candidates cannot be attributed and are left out
+    names = weighted_df.drop_duplicates(subset="last_name, first_name", keep=False)
+    name_ids = pd.Series(names["player_id"].to_numpy(), index=names["last_name, first_name"].astype(object))
+
+    projected = pd.concat([
+        df.assign(method=method)[["method", "last_name, first_name", "year"] + METRICS]
+        for method, df in zip(METHODS, (hist_proj_df, reg_proj_df, persistence_df)) if not df.empty
+    ], ignore_index=True)
+    projected["player_id"] = projected["last_name, first_name"].astype(object).map(name_ids)
+    projected = projected.dropna(subset=["player_id"]).melt(id_vars=["method", "player_id", "year"], value_vars=METRICS,
+                                                             var_name="metric", value_name="projected")
+
+    realized = full_data[full_data["year"] > cutoff].drop_duplicates(subset=["player_id", "year"]).melt(
+        id_vars=["player_id", "year"], value_vars=METRICS, var_name="metric", value_name="actual")
+
+    pairs = projected.merge(realized, on=["player_id", "year", "metric"], how="inner").dropna(subset=["projected", "actual"])
+    pairs.insert(0, "cutoff", cutoff)
+    pairs.insert(4, "horizon", pairs["year"] - cutoff)
+    return pairs.reset_index(drop=True)
+
+
+def share_batting_data(full_data: pd.DataFrame) -> None:
+    """
+    Process pool initializer: keeps the batting data in this worker for every cutoff it runs.
+    """
+    WORKER_DATA["full_data"] = full_data
+
+
+def run_shared_cutoff(cutoff: int, weighting: dict = None) -> pd.DataFrame:
+    """
+    run_cutoff against the batting data shared with this worker.
+    """
+    return run_cutoff(cutoff, WORKER_DATA["full_data"], weighting)
+
+
+def run_backtest(full_data: pd.DataFrame, cutoffs: list = None, weighting: dict = None, workers: int = 1) -> pd.DataFrame:
+    """
+    Runs run_cutoff for every cutoff (default: default_cutoffs) and returns all projection/realization pairs.
+    The batting data is loaded once by the caller and handed to each worker process once, when it starts, so
+    cutoffs never re-read or re-merge the source files. workers=1 runs the cutoffs in this process; workers=None
+    uses one process per CPU core.
+    """
+    cutoffs = default_cutoffs(full_data) if cutoffs is None else list(cutoffs)
+    if workers == 1 or len(cutoffs) <= 1:
+        results = [run_cutoff(cutoff, full_data, weighting) for cutoff in cutoffs]
+    else:
+        workers = min(workers or os.cpu_count(), len(cutoffs))
+        with ProcessPoolExecutor(max_workers=workers, initializer=share_batting_data, initargs=(full_data,)) as pool:
+            results = list(pool.map(partial(run_shared_cutoff, weighting=weighting), cutoffs))
+
+    results = [df for df in results if not df.empty]
+    if not results:
+        return pd.DataFrame(columns=["cutoff", "method", "player_id", "year", "horizon", "metric", "projected", "actual"])
+    return pd.concat(results, ignore_index=True)
+
+
+def summarize_errors(pairs: pd.DataFrame, by: list = None) -> pd.DataFrame:
+    """
+    Error of every method per metric and horizon (or any other grouping of the pairs' columns):
+    n, mean absolute error, root mean squared error and bias (mean of projected minus actual).
+    """
+    by = ["method", "metric", "horizon"] if by is None else by
+    errors = pairs.assign(error=pairs["projected"] - pairs["actual"])
+    errors["abs_error"] = errors["error"].abs()
+    errors["squared_error"] = errors["error"] ** 2
+
+    summary = errors.groupby(by, sort=True).agg(n=("error", "size"), mae=("abs_error", "mean"),
+                                                rmse=("squared_error", "mean"), bias=("error", "mean")).reset_index()
+    summary["rmse"] = np.sqrt(summary["rmse"])
+    return summary
+
+
+def print_summary(summary: pd.DataFrame) -> None:
+    """
+    Prints mean absolute error per metric, one block per method with a column per horizon.
+    """
+    for method in METHODS:
+        table = summary[summary["method"] == method].pivot(index="metric", columns="horizon", values="mae")
+        if table.empty:
+            continue
+        counts = summary[summary["method"] == method].groupby("horizon")["n"].max()
+        print(f"\n{method} (mean absolute error; players per horizon: "
+              + ", ".join(f"+{h}: {n}" for h, n in counts.items()) + ")")
+        print(table.reindex([m for m in METRICS if m in table.index]).to_string(float_format=lambda v: f"{v:.4f}"))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Backtest the breakout projections over past season cutoffs.")
+    parser.add_argument("--cutoffs", type=int, nargs="+",
+                        help="Seasons to treat as the latest one (default: every season with enough history before it "
+                             "and a realized season after it)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes running cutoffs concurrently (0 = one per CPU core)")
+    parser.add_argument("--half-life", type=float,
+                        help="Weight recent seasons by exponential decay with this half-life instead of the 0.4/0.6 weights")
+    parser.add_argument("--seasons", type=int, help="With --half-life, only weight the last N seasons")
+    parser.add_argument("--weight-by", metavar="COLUMN", help="Also weight each season by a playing-time column, e.g. pa")
+    parser.add_argument("--output", metavar="PATH", default="backtest_errors.csv",
+                        help="Where to write the per-method, metric and horizon error table")
+    parser.add_argument("--pairs", metavar="PATH", help="Also write every projected/realized pair")
+    return parser.parse_args()
+
+
+def main(args):
+    weighting = {"half_life": args.half_life, "n_seasons": args.seasons, "volume_column": args.weight_by}
+
+    print("Loading Statcast data...")
+    full_data = load_local_batting_data()
+    cutoffs = args.cutoffs or default_cutoffs(full_data)
+
+    print(f"Backtesting cutoffs {', '.join(map(str, cutoffs))}...")
+    start = time.perf_counter()
+    pairs = run_backtest(full_data, cutoffs, weighting=weighting, workers=args.workers or None)
+    print(f"{len(pairs):,} projected/realized pairs from {len(cutoffs)} cutoff(s) in {time.perf_counter() - start:.1f}s.")
+    if pairs.empty:
+        print("No projection could be compared to a realized season.")
+        return 1
+
+    summary = summarize_errors(pairs)
+    print_summary(summary)
+    summary.to_csv(args.output, index=False)
+    print(f"\nError table written to {args.output}.")
+    if args.pairs:
+        pairs.to_csv(args.pairs, index=False)
+        print(f"Projection pairs written to {args.pairs}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args()))
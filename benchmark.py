@@ -0,0 +1,365 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+import numpy as np
+
+from data_loader import ID_DTYPES, COALESCED_METRICS, clean_merged_batting, load_local_batting_data, METRICS
+from candidate_filter import filter_breakout_candidates
+from weighted_metrics import calculate_weighted_averages
+from similarity_and_breakout import compute_similarity_and_breakout
+from projections import match_and_project, match_and_project_ensemble, build_projection_reference
+from comp_index import CompIndex
+from trajectories import CareerTrajectories
+from parallel_projections import parallel_match_and_project
+from profiling import StageProfiler
+
+# Typical league centre and spread of each metric, used to draw plausible synthetic seasons
+METRIC_DISTRIBUTIONS = {
+    'exit_velocity_avg': (88.5, 2.5),
+    'launch_angle_avg': (12.5, 5.0),
+    'barrel_batted_rate': (8.0, 3.5),
+    'hard_hit_percent': (39.0, 7.0),
+    'xwoba': (0.320, 0.035),
+    'xba': (0.245, 0.025),
+    'xslg': (0.410, 0.065),
+}
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+# Raw Statcast leaderboard column for each pipeline metric, i.e. the inverse of the SEASON_SOURCES renames
+EXIT_VELOCITY_COLUMNS = {'exit_velocity_avg': 'avg_hit_speed', 'launch_angle_avg': 'avg_hit_angle',
+                         'barrel_batted_rate': 'brl_percent', 'hard_hit_percent': 'ev95percent'}
+EXPECTED_STATS_COLUMNS = {'xwoba': 'est_woba', 'xba': 'est_ba', 'xslg': 'est_slg'}
+
+# Stages faster than this in the baseline are too noisy to hold to a regression threshold
+MIN_TIMED_SECONDS = 0.05
+
+
+def make_synthetic_batting(n_rows: int, seed: int = 0, first_year: int = 2015, last_year: int = 2024,
+                           max_seasons: int = 10) -> pd.DataFrame:
+    """
+    Generates a batting.csv-shaped frame of exactly n_rows player-seasons with names, ids, ages and the seven Statcast metrics.
+    Players debut uniformly between first_year and last_year and play consecutive seasons (up to max_seasons, never past
+    last_year), so the data has established veterans for the reference pool as well as recent debuts for the candidate filter.
+    """
+    rng = np.random.default_rng(seed)
+
+    # Draw more careers than needed, then cut the concatenated seasons at n_rows
+    n_players = max(1, 2 * n_rows // max(1, (max_seasons + 1) // 2) + 1)
+    debut = rng.integers(first_year, last_year + 1, n_players)
+    lengths = np.minimum(rng.integers(1, max_seasons + 1, n_players), last_year - debut + 1)
+    n_players = int(np.searchsorted(np.cumsum(lengths), n_rows)) + 1
+    debut, lengths = debut[:n_players], lengths[:n_players]
+
+    player = np.repeat(np.arange(n_players), lengths)[:n_rows]
+    season = (np.arange(len(player)) - np.r_[0, np.cumsum(lengths)[:-1]][player])
+    debut_age = rng.integers(20, 30, n_players)
+
+    df = pd.DataFrame({
+        "last_name, first_name": pd.Series([f"Player{i}, Synthetic" for i in range(n_players)]).to_numpy()[player],
+        "player_id": (100000 + player).astype(str),
+        "year": debut[player] + season,
+        "player_age": (debut_age[player] + season).astype(float),
+    })
+
+    # Each player has a persistent skill offset so careers (and comps) are not pure noise
+    skill = rng.normal(0, 1, n_players)[player]
+    for metric, (mean, std) in METRIC_DISTRIBUTIONS.items():
+        df[metric] = np.round(mean + std * (0.7 * skill + 0.7 * rng.normal(0, 1, len(df))), 3)
+
+    df["pa"] = rng.integers(50, 700, len(df))
+    return df
+
+
+def make_synthetic_age_table(batting_df: pd.DataFrame, seed: int = 0, fraction: float = 0.5) -> pd.DataFrame:
+    """
+    Builds a supplemental age table (first_last_name, year, age_supplement) covering a random fraction of batting rows.
+    """
+    rng = np.random.default_rng(seed)
+    sample = batting_df.sample(frac=fraction, random_state=int(rng.integers(1 << 31)))
+    return pd.DataFrame({
+        "first_last_name": sample["last_name, first_name"].str.split(", ").str[::-1].str.join(" ").to_numpy(),
+        "year": sample["year"].to_numpy(),
+        "age_supplement": sample["player_age"].to_numpy(),
+    })
+
+
+def legacy_clean_merged_batting(merged_df: pd.DataFrame, supp_all: pd.DataFrame) -> pd.DataFrame:
+    """
+    The original row-wise cleaning stage of load_local_batting_data, kept as the "before" side of the benchmark.
+    """
+    merged_df["first_last_name"] = merged_df["last_name, first_name"].apply(lambda x: " ".join(x.split(", ")[::-1]))
+    merged_df = pd.merge(merged_df, supp_all, on=["first_last_name", "year"], how="left")
+    merged_df["player_age"] = merged_df.apply(
+        lambda row: row["age_supplement"] if pd.isna(row["player_age"]) and not pd.isna(row["age_supplement"]) else row["player_age"],
+        axis=1
+    )
+    merged_df.drop(columns=["age_supplement", "first_last_name"], inplace=True)
+
+    for col in COALESCED_METRICS:
+        x_col = f"{col}_x"
+        y_col = f"{col}_y"
+        if x_col in merged_df.columns and y_col in merged_df.columns:
+            merged_df[col] = merged_df.apply(
+                lambda row: row[y_col] if pd.isna(row[x_col]) or row[x_col] in ['', ' ', 'nan', 'NaN', np.nan] else row[x_col],
+                axis=1
+            )
+        merged_df.drop(columns=[x_col, y_col], inplace=True)
+
+    merged_df.dropna(subset=['player_age'] + METRICS, inplace=True)
+    merged_df.sort_values(by=["player_id", "year"], inplace=True)
+    return merged_df.drop_duplicates(subset=["player_id", "year"], keep="first")
+
+
+def build_merged_frame(batting_path: str, seed: int = 0) -> pd.DataFrame:
+    """
+    Reads a synthetic batting.csv and outer-merges it with a Statcast-style copy of its last two seasons,
+    blanking some batting metrics so the _x/_y coalescing has real work to do.
+    """
+    rng = np.random.default_rng(seed)
+    batting = pd.read_csv(batting_path, dtype=ID_DTYPES)
+
+    last_years = sorted(batting["year"].unique())[-2:]
+    statcast = batting.loc[batting["year"].isin(last_years), ["player_id", "last_name, first_name", "year"] + METRICS].copy()
+    for metric in METRICS:
+        blank = rng.random(len(batting)) < 0.2
+        batting.loc[blank, metric] = np.nan
+    batting.loc[rng.random(len(batting)) < 0.3, "player_age"] = np.nan
+
+    merged = pd.merge(batting, statcast, on=["player_id", "last_name, first_name", "year"], how="outer")
+    return merged.sort_values(by=["player_id", "year"]).reset_index(drop=True)
+
+
+def benchmark_loader_cleaning(n_rows: int, seed: int = 0, skip_legacy: bool = False) -> dict:
+    """
+    Times the row-wise (legacy) and vectorized loader cleaning stages on a synthetic n_rows batting.csv.
+    Returns rows/sec for each side and checks both produce the same frame.
+    """
+    batting = make_synthetic_batting(n_rows, seed=seed)
+    supp_all = make_synthetic_age_table(batting, seed=seed)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        batting_path = os.path.join(tmp_dir, "batting.csv")
+        batting.to_csv(batting_path, index=False)
+        merged = build_merged_frame(batting_path, seed=seed)
+
+    results = {"rows": len(merged)}
+
+    start = time.perf_counter()
+    vectorized = clean_merged_batting(merged.copy(), supp_all)
+    elapsed = time.perf_counter() - start
+    results["vectorized_seconds"] = elapsed
+    results["vectorized_rows_per_sec"] = len(merged) / elapsed
+
+    if not skip_legacy:
+        start = time.perf_counter()
+        legacy = legacy_clean_merged_batting(merged.copy(), supp_all)
+        elapsed = time.perf_counter() - start
+        results["legacy_seconds"] = elapsed
+        results["legacy_rows_per_sec"] = len(merged) / elapsed
+        results["speedup"] = results["legacy_seconds"] / results["vectorized_seconds"]
+        pd.testing.assert_frame_equal(vectorized, legacy, check_dtype=False)
+
+    return results
+
+
+def write_synthetic_dataset(data_dir: str, n_rows: int, seed: int = 0, statcast_years: int = 2) -> pd.DataFrame:
+    """
+    Writes a complete synthetic input set to data_dir: batting.csv plus "exit_velocity YY.csv", "expected_stats YY.csv"
+    and mlb-player-stats-BattersYYYY.csv for the last statcast_years seasons, in the same layouts as the real files.
+    Some recent batting metrics and ages are blanked so the loader's coalescing and age backfill do real work.
+    Returns the generated batting frame (before blanking).
+    """
+    rng = np.random.default_rng(seed)
+    batting = make_synthetic_batting(n_rows, seed=seed)
+    recent_years = sorted(batting["year"].unique())[-statcast_years:]
+
+    for year in recent_years:
+        season = batting[batting["year"] == year]
+        keys = season[["last_name, first_name", "player_id"]]
+
+        exit_velocity = keys.assign(**{raw: season[metric] for metric, raw in EXIT_VELOCITY_COLUMNS.items()})
+        exit_velocity.to_csv(os.path.join(data_dir, f"exit_velocity {year % 100:02d}.csv"), index=False)
+
+        expected_stats = keys.assign(year=year, pa=season["pa"],
+                                     **{raw: season[metric] for metric, raw in EXPECTED_STATS_COLUMNS.items()})
+        expected_stats.to_csv(os.path.join(data_dir, f"expected_stats {year % 100:02d}.csv"), index=False)
+
+        ages = pd.DataFrame({"Player": season["last_name, first_name"].str.split(", ").str[::-1].str.join(" "),
+                             "Team": "SYN", "Age": season["player_age"].astype(int)})
+        ages.to_csv(os.path.join(data_dir, f"mlb-player-stats-Batters{year}.csv"), index=False)
+
+    blanked = batting.copy()
+    recent = blanked["year"].isin(recent_years).to_numpy()
+    for metric in METRICS:
+        blanked.loc[recent & (rng.random(len(blanked)) < 0.2), metric] = np.nan
+    blanked.loc[recent & (rng.random(len(blanked)) < 0.3), "player_age"] = np.nan
+    blanked.to_csv(os.path.join(data_dir, "batting.csv"), index=False)
+
+    return batting
+
+
+def benchmark_pipeline(n_rows: int, seed: int = 0, max_candidates: int = 100, ensemble_k: int = 25,
+                       workers: int = 1) -> dict:
+    """
+    Generates an n_rows synthetic dataset and runs every pipeline stage against it under a StageProfiler.
+    The comp search is O(candidates x reference log reference), so matching stages run on at most max_candidates
+    candidates; every stage's throughput is reported against the rows it actually processed.
+    Returns the profiler report with rows_per_sec added to each stage.
+    """
+    profiler = StageProfiler()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        write_synthetic_dataset(tmp_dir, n_rows, seed=seed)
+        batting_path = os.path.join(tmp_dir, "batting.csv")
+        cache_dir = os.path.join(tmp_dir, ".cache")
+
+        with profiler.stage("load_local_batting_data", rows_in=n_rows) as stage:
+            batting_df = load_local_batting_data(batting_path, cache_dir=cache_dir)
+            stage["rows_out"] = len(batting_df)
+
+        with profiler.stage("load_local_batting_data_cached", rows_in=n_rows) as stage:
+            stage["rows_out"] = len(load_local_batting_data(batting_path, cache_dir=cache_dir))
+
+    with profiler.stage("filter_breakout_candidates", rows_in=len(batting_df)) as stage:
+        breakout_candidates_df = filter_breakout_candidates(batting_df)
+        stage["rows_out"] = len(breakout_candidates_df)
+
+    with profiler.stage("build_projection_reference", rows_in=len(batting_df)) as stage:
+        reference_df = build_projection_reference(batting_df)
+        stage["rows_out"] = len(reference_df)
+
+    with profiler.stage("calculate_weighted_averages", rows_in=len(breakout_candidates_df)) as stage:
+        weighted_df = calculate_weighted_averages(breakout_candidates_df)
+        stage["rows_out"] = len(weighted_df)
+
+    with profiler.stage("compute_similarity_and_breakout", rows_in=len(weighted_df)) as stage:
+        scored_df = compute_similarity_and_breakout(weighted_df, reference_df)
+        stage["rows_out"] = len(scored_df)
+
+    with profiler.stage("build_comp_index", rows_in=len(reference_df)) as stage:
+        stage["rows_out"] = len(CompIndex(reference_df).values)
+
+    with profiler.stage("build_career_trajectories", rows_in=len(batting_df)) as stage:
+        trajectories = CareerTrajectories.from_history(batting_df, player_ids=reference_df["player_id"].unique())
+        stage["rows_out"] = len(trajectories.player_ids)
+
+    sample_df = scored_df.head(max_candidates)
+    with profiler.stage("match_and_project", rows_in=len(sample_df)) as stage:
+        if workers != 1:
+            hist_proj_df, reg_proj_df = parallel_match_and_project(sample_df, reference_df, batting_df,
+                                                                   workers=workers or None, trajectories=trajectories)
+        else:
+            hist_proj_df, reg_proj_df = match_and_project(sample_df, reference_df, batting_df, trajectories=trajectories)
+        stage["rows_out"] = len(hist_proj_df) + len(reg_proj_df)
+
+    if ensemble_k:
+        with profiler.stage("match_and_project_ensemble", rows_in=len(sample_df)) as stage:
+            ensemble_proj_df, _ = match_and_project_ensemble(sample_df, reference_df, batting_df, k=ensemble_k,
+                                                             trajectories=trajectories)
+            stage["rows_out"] = len(ensemble_proj_df)
+
+    report = profiler.report()
+    for record in report["stages"]:
+        record["rows_per_sec"] = record["rows_in"] / record["wall_seconds"] if record["wall_seconds"] else None
+    report["rows"] = n_rows
+    return report
+
+
+def find_regressions(results: dict, baseline: dict, max_regression: float = 0.25) -> list:
+    """
+    Compares per-stage throughput against a saved baseline run, both keyed by dataset size.
+    A stage regresses when its rows/sec falls more than max_regression (a fraction) below the baseline's.
+    Returns one message per regressed stage.
+    """
+    regressions = []
+    for size, report in results.items():
+        if size not in baseline:
+            continue
+        baseline_stages = {record["stage"]: record for record in baseline[size]["stages"]}
+        for record in report["stages"]:
+            before = baseline_stages.get(record["stage"])
+            if before is None or not before["rows_per_sec"] or before["wall_seconds"] < MIN_TIMED_SECONDS:
+                continue
+            change = record["rows_per_sec"] / before["rows_per_sec"] - 1
+            if change < -max_regression:
+                regressions.append(f"{record['stage']} at {int(size):,} rows: {record['rows_per_sec']:,.0f} rows/sec "
+                                   f"vs {before['rows_per_sec']:,.0f} baseline ({change:+.0%})")
+    return regressions
+
+
+def print_pipeline_report(report: dict) -> None:
+    """
+    Prints one line per stage of a benchmark_pipeline report.
+    """
+    print(f"\n{report['rows']:,} synthetic player-seasons (peak RSS {report['peak_rss_mb']:,.0f} MB)")
+    print(f"{'stage':<34}{'seconds':>10}{'rows in':>12}{'rows/sec':>14}")
+    for record in report["stages"]:
+        rows_per_sec = "" if record["rows_per_sec"] is None else f"{record['rows_per_sec']:,.0f}"
+        print(f"{record['stage']:<34}{record['wall_seconds']:>10.3f}{record['rows_in']:>12,}{rows_per_sec:>14}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic Statcast data.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="Synthetic player-season counts to benchmark (default 10k, 100k and 1M)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-candidates", type=int, default=100,
+                        help="Candidates to run through the comp matching stages at each size")
+    parser.add_argument("--ensemble-k", type=int, default=25, help="Comps per candidate for the ensemble stage (0 to skip)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes for the match-and-project stage (0 = one per CPU core)")
+    parser.add_argument("--output", metavar="PATH", help="Write the per-size stage reports as JSON")
+    parser.add_argument("--baseline", metavar="PATH",
+                        help="Compare against a previous --output file and exit non-zero on any regression")
+    parser.add_argument("--max-regression", type=float, default=0.25,
+                        help="Allowed rows/sec drop per stage versus --baseline, as a fraction")
+    parser.add_argument("--loader-cleaning", action="store_true",
+                        help="Instead, compare the row-wise and vectorized loader cleaning stages on --rows rows")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Synthetic rows for --loader-cleaning")
+    parser.add_argument("--skip-legacy", action="store_true", help="With --loader-cleaning, only time the vectorized stage")
+    return parser.parse_args()
+
+
+def main(args):
+    if args.loader_cleaning:
+        results = benchmark_loader_cleaning(args.rows, seed=args.seed, skip_legacy=args.skip_legacy)
+        print(f"Rows cleaned: {results['rows']:,}")
+        print(f"Vectorized: {results['vectorized_seconds']:.2f}s ({results['vectorized_rows_per_sec']:,.0f} rows/sec)")
+        if "legacy_seconds" in results:
+            print(f"Row-wise:   {results['legacy_seconds']:.2f}s ({results['legacy_rows_per_sec']:,.0f} rows/sec)")
+            print(f"Speedup:    {results['speedup']:.1f}x")
+        return 0
+
+    # JSON keys are strings, so key sizes the same way in memory
+    results = {}
+    for size in args.sizes:
+        results[str(size)] = benchmark_pipeline(size, seed=args.seed, max_candidates=args.max_candidates,
+                                                ensemble_k=args.ensemble_k, workers=args.workers)
+        print_pipeline_report(results[str(size)])
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBenchmark results written to {args.output}.")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, max_regression=args.max_regression)
+        if regressions:
+            print(f"\n{len(regressions)} stage(s) regressed more than {args.max_regression:.0%}:")
+            for message in regressions:
+                print(f"  {message}")
+            return 1
+        print(f"\nNo stage regressed more than {args.max_regression:.0%} against {args.baseline}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args()))
@@ -1,32 +1,27 @@
 import pandas as pd
 
-def filter_breakout_candidates(df: pd.DataFrame) -> pd.DataFrame:
+ELITE_METRICS = ['xwoba', 'xba', 'xslg']
+
+
+def filter_breakout_candidates(df: pd.DataFrame, min_debut_year: int = 2023, max_age: int = 27,
+                               elite_quantile: float = 0.95, elite_metrics: list = ELITE_METRICS) -> pd.DataFrame:
     """
     Filters for breakout candidates who:
-    - Had their first MLB season in 2023 or later
-    - Are under age 27 across all seasons (or have missing age)
-    - Never ranked in the top 5% for xwOBA, xBA, or xSLG in any single season
+    - Had their first MLB season in min_debut_year (default 2023) or later
+    - Are under max_age (default 27) across all seasons (or have missing age)
+    - Never reached the elite_quantile (default top 5%) for any elite_metrics (default xwOBA, xBA, xSLG) in any single season
+    Every rule is a grouped aggregation, so the filter is a few vectorized passes regardless of player count.
     """
-    # Filter by first recorded season (must be 2023 or later)
-    first_years = df.groupby('player_id')['year'].min()
-    recent_starts = first_years[first_years >= 2023].index
-    df = df[df['player_id'].isin(recent_starts)].copy()
-
-    # Filter by age (under 27 in all known seasons or all missing)
-    def age_ok(ages):
-        return ages.dropna().lt(27).all() or ages.isna().all()
-
-    age_filtered = df.groupby('player_id')['player_age'].apply(age_ok)
-    eligible_ids = age_filtered[age_filtered].index
-    filtered_df = df[df['player_id'].isin(eligible_ids)].copy()
+    # Filter by first recorded season and by age (under max_age in all known seasons or all missing)
+    by_player = df.groupby('player_id')
+    first_year = by_player['year'].transform('min')
+    oldest = by_player['player_age'].transform('max')
+    eligible = (first_year >= min_debut_year) & (oldest.isna() | (oldest < max_age))
+    filtered_df = df[eligible].copy()
 
-    # Disqualify players who had elite metrics in any year
-    disqualify_ids = set()
-    for year in filtered_df['year'].unique():
-        year_df = filtered_df[filtered_df['year'] == year]
-        for metric in ['xwoba', 'xba', 'xslg']:
-            threshold = year_df[metric].quantile(0.95)
-            elite_players = year_df[year_df[metric] >= threshold]['player_id']
-            disqualify_ids.update(elite_players)
+    # Disqualify players who had elite metrics in any year, against that year's eligible pool
+    thresholds = filtered_df.groupby('year')[elite_metrics].transform('quantile', elite_quantile)
+    elite_rows = (filtered_df[elite_metrics] >= thresholds).any(axis=1)
+    disqualify_ids = filtered_df.loc[elite_rows, 'player_id'].unique()
 
     return filtered_df[~filtered_df['player_id'].isin(disqualify_ids)].copy()
@@ -0,0 +1,127 @@
+import pickle
+
+import pandas as pd
+import numpy as np
+from sklearn.neighbors import KDTree
+
+from data_loader import METRICS
+
+COMP_INDEX_PATH = "comp_index.pkl"
+
+
+class CompIndex:
+    """
+    Reusable lookup structure over the reference pool built by build_projection_reference.
+    Holds one sorted array per metric for rank-distance queries (the same rank-sum rule match_and_project uses)
+    and, optionally, a KD-tree over z-scored metrics for Euclidean nearest-neighbour comps.
+    Build it once per reference set, save it, and query top-k comps for any player without rerunning the pipeline.
+    """
+
+    def __init__(self, reference_df: pd.DataFrame, metrics: list = METRICS, euclidean: bool = True):
+        self.metrics = list(metrics)
+        self.values = reference_df[self.metrics].to_numpy(dtype=np.float64)
+        self.player_ids = reference_df["player_id"].to_numpy(dtype=object)
+        self.names = reference_df["last_name, first_name"].to_numpy(dtype=object)
+        self.years = reference_df["year"].to_numpy()
+
+        # Per-metric sorted values plus the reference row each sorted slot came from
+        self.order = np.argsort(self.values, axis=0, kind="stable")
+        self.sorted_values = np.take_along_axis(self.values, self.order, axis=0)
+
+        # Population statistics match sklearn's StandardScaler (ddof=0)
+        self.mean = self.values.mean(axis=0) if len(self.values) else np.zeros(len(self.metrics))
+        std = self.values.std(axis=0) if len(self.values) else np.ones(len(self.metrics))
+        self.scale = np.where(std == 0, 1.0, std)
+        self.tree = KDTree((self.values - self.mean) / self.scale) if euclidean and len(self.values) else None
+
+    def __len__(self):
+        return len(self.values)
+
+    def rank_totals(self, candidate: np.ndarray) -> np.ndarray:
+        """
+        Summed per-metric min-rank of |reference - candidate| for every reference row, for one candidate.
+        Distances on each side of the candidate are monotone in the sorted values, so each rank is two searchsorted calls.
+        """
+        totals = np.zeros(len(self.values), dtype=np.float64)
+        for m in range(len(self.metrics)):
+            sorted_m = self.sorted_values[:, m]
+            split = np.searchsorted(sorted_m, candidate[m], side="left")
+            dist = np.abs(sorted_m - candidate[m])
+            above = dist[split:]
+            below = dist[:split][::-1]
+
+            # Count rows strictly closer than each row; ties share the lowest rank like rank(method='min')
+            closer = np.searchsorted(above, dist, side="left") + np.searchsorted(below, dist, side="left")
+            totals[self.order[:, m]] += closer + 1.0
+        return totals
+
+    def query_rank(self, candidate_values: np.ndarray, k: int = 1) -> tuple:
+        """
+        Top-k reference rows by summed metric rank for each candidate row.
+        Returns (positions, rank_totals), each (n_candidates, k); ties go to the earlier reference row,
+        so k=1 gives the same comp as match_and_project. Rows with missing metrics get position -1.
+        """
+        candidate_values = np.atleast_2d(np.asarray(candidate_values, dtype=np.float64))
+        k = min(k, len(self.values))
+        positions = np.full((len(candidate_values), k), -1, dtype=np.int64)
+        totals = np.full((len(candidate_values), k), np.nan)
+
+        for i, candidate in enumerate(candidate_values):
+            if np.isnan(candidate).any():
+                continue
+            row_totals = self.rank_totals(candidate)
+            top = np.argsort(row_totals, kind="stable")[:k]
+            positions[i] = top
+            totals[i] = row_totals[top]
+        return positions, totals
+
+    def query_euclidean(self, candidate_values: np.ndarray, k: int = 1) -> tuple:
+        """
+        Top-k reference rows by Euclidean distance in z-scored metric space.
+        Returns (positions, distances), each (n_candidates, k).
+        """
+        if self.tree is None:
+            raise ValueError("CompIndex was built without a KD-tree; rebuild it with euclidean=True.")
+        candidate_values = np.atleast_2d(np.asarray(candidate_values, dtype=np.float64))
+        distances, positions = self.tree.query((candidate_values - self.mean) / self.scale, k=min(k, len(self.values)))
+        return positions, distances
+
+    def comps(self, candidate_df: pd.DataFrame, k: int = 5, method: str = "rank") -> pd.DataFrame:
+        """
+        Long table of the top-k comps for each candidate: candidate name, comp_rank, comp player_id, name, season and score.
+        method is "rank" (summed metric rank, lower is closer) or "euclidean" (z-scored distance).
+        """
+        values = candidate_df[self.metrics].to_numpy(dtype=np.float64)
+        if method == "rank":
+            positions, scores = self.query_rank(values, k)
+        elif method == "euclidean":
+            positions, scores = self.query_euclidean(values, k)
+        else:
+            raise ValueError(f"Unknown comp method: {method}")
+
+        n_candidates, n_comps = positions.shape
+        found = positions.ravel() >= 0
+        flat = positions.ravel()[found]
+        return pd.DataFrame({
+            "last_name, first_name": np.repeat(candidate_df["last_name, first_name"].to_numpy(), n_comps)[found],
+            "comp_rank": np.tile(np.arange(1, n_comps + 1), n_candidates)[found],
+            "comp_player_id": self.player_ids[flat],
+            "comp_name": self.names[flat],
+            "comp_year": self.years[flat],
+            "score": scores.ravel()[found],
+        })
+
+    def save(self, path: str = COMP_INDEX_PATH) -> None:
+        """
+        Writes the index to disk.
+        """
+        with open(path, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path: str = COMP_INDEX_PATH) -> "CompIndex":
+        """
+        Reads an index written by save.
+        """
+        with open(path, "rb") as f:
+            return pickle.load(f)
@@ -1,55 +1,204 @@
+import hashlib
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
-import numpy as np
 
-def load_local_batting_data(batting_path: str = "batting.csv") -> pd.DataFrame:
-    """ Loads core batting data from batting.csv, merges Statcast expected stats (xwOBA, xBA, xSLG, etc.) and exit velocity data from separate CSVs for 2023 and 2024.
-        fills missing Statcast ages for newer players from external supplemental CSVs (mlb-player-stats-Batters2023.csv and 2024.csv).
-    """
-    # Load primary batting data
-    df = pd.read_csv("batting.csv")
-    df["player_id"] = df["player_id"].astype(str)
+from player_index import (
+    build_player_index,
+    load_player_index,
+    save_player_index,
+    resolve_supplemental_ages,
+    PLAYER_INDEX_FILE
+    )
 
-    # Load expected stats 2023 and 2024
-    expected_23 = pd.read_csv("expected_stats 23.csv")
-    expected_24 = pd.read_csv("expected_stats 24.csv")
-    ev_23 = pd.read_csv("exit_velocity 23.csv")
-    ev_24 = pd.read_csv("exit_velocity 24.csv")
+CACHE_DIR = ".cache"
 
-    for df_ in [expected_23, expected_24, ev_23, ev_24]:
-        df_["player_id"] = df_["player_id"].astype(str)
+# Bumped whenever the merged frame's columns change, so caches built by older code are not reused
+CACHE_VERSION = 5
 
-    # Standardize and combine Statcast supplemental files
-    def standardize_and_merge(ev, estats, year):
-        df_ev = ev.copy()
-        df_estats = estats.copy()
+# Declared at read time so ids never round-trip through int64
+ID_DTYPES = {"player_id": str, "year": "int64"}
 
-        df_ev["year"] = year
-        df_estats["year"] = year
+MERGE_KEYS = ["player_id", "last_name, first_name", "year"]
 
-        # For exit_velocity
-        df_ev = df_ev.rename(columns={
+# Per-season source files: filename pattern (capturing the season) and the columns to rename on read.
+# Adding a season only means dropping a matching file next to batting.csv.
+SEASON_SOURCES = {
+    "exit_velocity": {
+        "pattern": r"^exit_velocity (\d{2}|\d{4})\.csv$",
+        "rename": {
             "avg_hit_speed": "exit_velocity_avg",
             "avg_hit_angle": "launch_angle_avg",
             "brl_percent": "barrel_batted_rate",
             "ev95percent": "hard_hit_percent"
-        })
-
-        # For expected_stats
-        df_estats = df_estats.rename(columns={
+        },
+        "columns": ["last_name, first_name", "player_id", "year",
+                    "exit_velocity_avg", "launch_angle_avg", "barrel_batted_rate", "hard_hit_percent"],
+    },
+    "expected_stats": {
+        "pattern": r"^expected_stats (\d{2}|\d{4})\.csv$",
+        "rename": {
             "est_woba": "xwoba",
             "est_ba": "xba",
             "est_slg": "xslg"
-        })
+        },
+        "columns": ["last_name, first_name", "player_id", "year", "pa", "xwoba", "xba", "xslg"],
+    },
+    "age": {
+        "pattern": r"^mlb-player-stats-Batters(\d{4})\.csv$",
+        "rename": {"Player": "first_last_name", "Age": "age_supplement"},
+        "columns": ["first_last_name", "year", "age_supplement"],
+    },
+}
+
+# The Statcast metrics every stage compares, scores and projects, in display order
+METRICS = ['exit_velocity_avg', 'launch_angle_avg', 'barrel_batted_rate',
+           'hard_hit_percent', 'xwoba', 'xba', 'xslg']
+
+COALESCED_METRICS = ['xba', 'exit_velocity_avg', 'launch_angle_avg', 'xwoba', 'xslg', 'barrel_batted_rate', 'hard_hit_percent']
+
+# Playing-time columns present in both batting.csv and the expected stats files, used for volume weighting
+COALESCED_VOLUMES = ['pa']
+
+REQUIRED_METRICS = ['player_age'] + METRICS
+
+BLANK_MARKERS = ['', ' ', 'nan', 'NaN']
+
+# Every column the pipeline uses and its in-memory dtype; batting.csv's other columns are never parsed.
+# Ids stay strings because they are the join key everywhere; names repeat across seasons, so they are categorical.
+# Ages and plate appearances are whole numbers, exact in float32. The Statcast metrics stay float64: comps are chosen
+# by summed rank of |reference - candidate|, and float32 rounding changes which of those distances tie.
+BATTING_SCHEMA = {
+    "last_name, first_name": "category",
+    "player_id": "str",
+    "year": "int32",
+    "player_age": "float32",
+    "pa": "float32",
+    "exit_velocity_avg": "float64",
+    "launch_angle_avg": "float64",
+    "barrel_batted_rate": "float64",
+    "hard_hit_percent": "float64",
+    "xwoba": "float64",
+    "xba": "float64",
+    "xslg": "float64",
+}
+
+
+def discover_season_files(data_dir: str = ".") -> dict:
+    """ Finds every per-season source file in data_dir, returning {kind: [(year, path), ...]} sorted by year.
+        Two-digit seasons in filenames ("exit_velocity 23.csv") are read as 20xx.
+    """
+    found = {kind: [] for kind in SEASON_SOURCES}
+    for name in sorted(os.listdir(data_dir or ".")):
+        for kind, spec in SEASON_SOURCES.items():
+            match = re.match(spec["pattern"], name)
+            if match:
+                year = int(match.group(1))
+                found[kind].append((year + 2000 if year < 100 else year, os.path.join(data_dir, name)))
+    return {kind: sorted(files) for kind, files in found.items()}
+
+
+def source_paths(batting_path: str = "batting.csv") -> list:
+    """ Lists batting_path plus every discovered season file, in a stable order.
+    """
+    season_files = discover_season_files(os.path.dirname(batting_path))
+    return [batting_path] + [path for kind in SEASON_SOURCES for _, path in season_files[kind]]
 
-        merged = pd.merge(df_ev, df_estats, on=["player_id", "last_name, first_name", "year"], how="outer")
-        return merged
 
-    merged_23 = standardize_and_merge(ev_23, expected_23, 2023)
-    merged_24 = standardize_and_merge(ev_24, expected_24, 2024)
-    statcast_combined = pd.concat([merged_23, merged_24], ignore_index=True)
+def source_fingerprint(paths: list) -> str:
+    """ Hashes the name and content of every input file so any edit to a source CSV produces a new cache key.
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(os.path.basename(path).encode())
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def load_local_batting_data(batting_path: str = "batting.csv", cache_dir: str = CACHE_DIR, use_cache: bool = True) -> pd.DataFrame:
+    """ Loads core batting data from batting_path, merges Statcast expected stats (xwOBA, xBA, xSLG, etc.) and exit velocity data
+        from every per-season CSV found next to it, and fills missing Statcast ages for newer players from the supplemental
+        mlb-player-stats-BattersYYYY.csv files.
+        The merged frame is cached as Parquet under cache_dir, keyed on the content of every source CSV, and reloaded without parsing when nothing changed.
+    """
+    if not use_cache:
+        merged_df = merge_batting_sources(batting_path, player_index_path=None)
+        print(memory_report(merged_df, batting_path))
+        return merged_df
+
+    cache_path = os.path.join(cache_dir, f"batting_v{CACHE_VERSION}_{source_fingerprint(source_paths(batting_path))}.parquet")
+    if os.path.exists(cache_path):
+        merged_df = pd.read_parquet(cache_path)
+        print(memory_report(merged_df, batting_path))
+        return merged_df
+
+    merged_df = merge_batting_sources(batting_path, player_index_path=os.path.join(cache_dir, PLAYER_INDEX_FILE))
+    print(memory_report(merged_df, batting_path))
+
+    # Replace any stale cache with the fresh build (write then rename so readers never see a partial file)
+    os.makedirs(cache_dir, exist_ok=True)
+    for name in os.listdir(cache_dir):
+        if name.startswith("batting_") and name.endswith(".parquet"):
+            os.remove(os.path.join(cache_dir, name))
+    tmp_path = cache_path + ".tmp"
+    merged_df.to_parquet(tmp_path)
+    os.replace(tmp_path, cache_path)
+
+    return merged_df
+
+
+def read_season_file(kind: str, year: int, path: str) -> pd.DataFrame:
+    """ Reads one per-season file and normalizes it with the SEASON_SOURCES spec for its kind.
+    """
+    spec = SEASON_SOURCES[kind]
+    source_names = {new: old for old, new in spec["rename"].items()}
+    usecols = {source_names.get(col, col) for col in spec["columns"]} - {"year"}
+    df = pd.read_csv(path, dtype={"player_id": str}, usecols=lambda col: col in usecols)
+    df["year"] = year
+    df = df.rename(columns=spec["rename"])
+    return df[spec["columns"]]
+
+
+def read_season_sources(season_files: dict, max_workers: int = None) -> dict:
+    """ Reads every discovered season file on a thread pool and concatenates each kind once, in season order.
+    """
+    jobs = [(kind, year, path) for kind, files in season_files.items() for year, path in files]
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        frames = list(pool.map(lambda job: read_season_file(*job), jobs))
+
+    combined = {}
+    for kind in season_files:
+        kind_frames = [frame for (job_kind, _, _), frame in zip(jobs, frames) if job_kind == kind]
+        combined[kind] = pd.concat(kind_frames, ignore_index=True) if kind_frames else None
+    return combined
+
+
+def merge_batting_sources(batting_path: str = "batting.csv", max_workers: int = None, player_index_path: str = None) -> pd.DataFrame:
+    """ Parses and merges every source CSV into the cleaned per-season batting frame used by the pipeline.
+        With player_index_path, the player identity index saved there is reused (only new players' names are normalized)
+        and the updated index is saved back.
+    """
+    # Load primary batting data, parsing only the schema's columns
+    df = pd.read_csv(batting_path, dtype=ID_DTYPES, usecols=lambda col: col in BATTING_SCHEMA)
+
+    # Load every season of Statcast and age files at once
+    season = read_season_sources(discover_season_files(os.path.dirname(batting_path)), max_workers=max_workers)
+
+    # Combine exit velocity and expected stats across all seasons in one merge
+    statcast_parts = [season[kind] for kind in ("exit_velocity", "expected_stats") if season[kind] is not None]
+    if len(statcast_parts) == 2:
+        statcast_combined = pd.merge(statcast_parts[0], statcast_parts[1], on=MERGE_KEYS, how="outer")
+    elif statcast_parts:
+        statcast_combined = statcast_parts[0]
+    else:
+        statcast_combined = pd.DataFrame(columns=MERGE_KEYS)
 
     # Merge with primary batting data
-    df = pd.merge(df, statcast_combined, on=["player_id", "last_name, first_name", "year"], how="outer")
+    df = pd.merge(df, statcast_combined, on=MERGE_KEYS, how="outer")
     merged_df = df.copy()
 
     # Sort and reset
@@ -58,65 +207,104 @@ def load_local_batting_data(batting_path: str = "batting.csv") -> pd.DataFrame:
 
     #Fill missing player_age using supplemental CSVs
     print("Loading supplemental player age data...")
+    supp_all = season["age"]
+    if supp_all is None:
+        supp_all = pd.DataFrame(columns=SEASON_SOURCES["age"]["columns"])
+
+    if player_index_path is not None:
+        player_index = build_player_index(merged_df, load_player_index(player_index_path))
+        save_player_index(player_index, player_index_path)
+    else:
+        player_index = build_player_index(merged_df)
+
+    return apply_schema(clean_merged_batting(merged_df, supp_all, player_index))
+
+
+def apply_schema(df: pd.DataFrame, schema: dict = BATTING_SCHEMA) -> pd.DataFrame:
+    """ Keeps only the schema's columns, in schema order, cast to their declared dtypes.
+    """
+    columns = [col for col in schema if col in df.columns]
+    return df[columns].astype({col: schema[col] for col in columns}).reset_index(drop=True)
+
+
+def memory_report(df: pd.DataFrame, batting_path: str = None) -> str:
+    """ Describes the frame's resident size against the same rows at pandas' default float64/object dtypes,
+        and how many of batting_path's columns were skipped at parse time.
+    """
+    compact = df.memory_usage(deep=True).sum()
+    default = df.astype({col: "object" if df[col].dtype == "category" else "float64" if df[col].dtype.kind == "f"
+                         else "int64" if df[col].dtype.kind in "iu" else df[col].dtype for col in df.columns})
+    default = default.memory_usage(deep=True).sum()
+
+    report = f"Batting data: {len(df):,} rows, {compact / 2**20:,.1f} MB ({default / 2**20:,.1f} MB at default dtypes"
+    if batting_path is not None:
+        n_source_columns = len(pd.read_csv(batting_path, nrows=0).columns)
+        report += f"; {n_source_columns - len(df.columns)} of {n_source_columns} source columns never parsed"
+    return report + ")."
 
-    # Load and combine 2023 and 2024 age data
-    supp_2023 = pd.read_csv("mlb-player-stats-Batters2023.csv")
-    supp_2024 = pd.read_csv("mlb-player-stats-Batters2024.csv")
 
-    supp_2023["year"] = 2023
-    supp_2024["year"] = 2024
+def to_first_last(names: pd.Series) -> pd.Series:
+    """ Converts "Last, First" names to "First Last", doing the string work once per distinct name.
+    """
+    codes, uniques = pd.factorize(names)
+    flipped = pd.Series(uniques).str.split(", ").str[::-1].str.join(" ")
+    return pd.Series(flipped.to_numpy()[codes], index=names.index)
+
+
+def coalesce_columns(df: pd.DataFrame, columns: list) -> pd.DataFrame:
+    """ Collapses each col_x/col_y pair left by the merges into col, preferring col_x unless it is missing or blank.
+    """
+    for col in columns:
+        x_col = f"{col}_x"
+        y_col = f"{col}_y"
+        if x_col in df.columns and y_col in df.columns:
+            missing = df[x_col].isna()
+            if not pd.api.types.is_numeric_dtype(df[x_col]):
+                missing |= df[x_col].isin(BLANK_MARKERS)
+            df[col] = df[x_col].where(~missing, df[y_col])
+            df.drop(columns=[x_col, y_col], inplace=True)
+    return df
 
-    supp_all = pd.concat([supp_2023, supp_2024], ignore_index=True)
-    supp_all = supp_all.rename(columns={"Player": "first_last_name", "Age": "age_supplement"})
-    supp_all = supp_all[["first_last_name", "year", "age_supplement"]]
 
-    # Create name format to match supplemental
-    merged_df["first_last_name"] = merged_df["last_name, first_name"].apply(lambda x: " ".join(x.split(", ")[::-1]))
+def clean_merged_batting(merged_df: pd.DataFrame, supp_all: pd.DataFrame, player_index: pd.DataFrame = None) -> pd.DataFrame:
+    """ Backfills player_age from the supplemental age table, coalesces the merge's _x/_y metric columns and
+        drops rows missing a required metric or duplicating a (player_id, year). Every step is a column operation.
+        Supplemental rows are matched to players through player_index (built from merged_df if not given), so accents,
+        suffixes and middle initials that differ between sources do not lose the age.
+    """
+    # Resolve supplemental ages to player_id through normalized name keys
+    if player_index is None:
+        player_index = build_player_index(merged_df)
+    missing_age = merged_df.loc[merged_df["player_age"].isna(), ["player_id", "year"]]
+    supp_ages = resolve_supplemental_ages(supp_all, player_index, player_seasons=missing_age)
 
     # Merge supplemental age info
     merged_df = pd.merge(
         merged_df,
-        supp_all,
-        on=["first_last_name", "year"],
+        supp_ages,
+        on=["player_id", "year"],
         how="left"
     )
 
     # Fill in missing player_age from supplemental
-    merged_df["player_age"] = merged_df.apply(
-        lambda row: row["age_supplement"] if pd.isna(row["player_age"]) and not pd.isna(row["age_supplement"]) else row["player_age"],
-        axis=1
-    )
+    merged_df["age_backfilled"] = merged_df["player_age"].isna() & merged_df["age_supplement"].notna()
+    merged_df["player_age"] = merged_df["player_age"].fillna(merged_df["age_supplement"])
 
     # Cleanup
-    merged_df.drop(columns=["age_supplement", "first_last_name"], inplace=True)
+    merged_df.drop(columns=["age_supplement"], inplace=True)
 
     # merge of _x and _y columns
-    for col in ['xba', 'exit_velocity_avg', 'launch_angle_avg', 'xwoba', 'xslg', 'barrel_batted_rate', 'hard_hit_percent']:
-        x_col = f"{col}_x"
-        y_col = f"{col}_y"
-        if x_col in merged_df.columns and y_col in merged_df.columns:
-            merged_df[col] = merged_df.apply(
-             lambda row: row[y_col] if pd.isna(row[x_col]) or row[x_col] in ['', ' ', 'nan', 'NaN', np.nan] else row[x_col],
-                axis=1
-         )
-        merged_df.drop(columns=[x_col, y_col], inplace=True)
-    
+    coalesce_columns(merged_df, COALESCED_METRICS + COALESCED_VOLUMES)
+
     # Drop rows that are missing any key Statcast metric
-    required_metrics = [
-        'player_age',
-        'exit_velocity_avg',
-        'launch_angle_avg',
-        'barrel_batted_rate',
-        'hard_hit_percent',
-        'xwoba',
-        'xba',
-        'xslg',
-    ]
-    
-    merged_df.dropna(subset=required_metrics, inplace=True)
-
-    # Remove duplicate (player_id, year) entries — keep first
-    merged_df.sort_values(by=["player_id", "year"], inplace=True)
+    merged_df.dropna(subset=REQUIRED_METRICS, inplace=True)
+
+    # Remove duplicate (player_id, year) entries — keep first, preferring a row whose age Statcast reported itself
+    merged_df.sort_values(by=["player_id", "year", "age_backfilled"], inplace=True)
     merged_df = merged_df.drop_duplicates(subset=["player_id", "year"], keep="first")
-    
+    merged_df = merged_df.drop(columns="age_backfilled")
+
+    # One spelling per player (sources disagree on suffixes like "Jr."), taken from their latest season
+    merged_df["last_name, first_name"] = merged_df.groupby("player_id")["last_name, first_name"].transform("last")
+
     return merged_df
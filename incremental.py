@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+
+import pandas as pd
+import numpy as np
+
+from data_loader import METRICS
+from weighted_metrics import calculate_weighted_averages
+from similarity_and_breakout import compute_similarity_and_breakout, SuperstarScorer
+from projections import match_and_project
+
+STATE_DIR = os.path.join(".cache", "incremental")
+
+
+def player_fingerprints(df: pd.DataFrame, columns: list) -> pd.Series:
+    """
+    Hashes each player's rows over the given columns into one uint64 per player_id.
+    Row hashes are combined with a wrapping sum so the result does not depend on row order.
+    """
+    if df.empty:
+        return pd.Series(dtype=np.uint64)
+
+    row_hashes = pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+    ids = df["player_id"].to_numpy()
+    order = np.argsort(ids, kind="stable")
+    unique_ids, starts, counts = np.unique(ids[order], return_index=True, return_counts=True)
+
+    combined = np.add.reduceat(row_hashes[order], starts)
+    combined ^= counts.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+    return pd.Series(combined, index=unique_ids)
+
+
+def frame_fingerprint(df: pd.DataFrame, columns: list) -> str:
+    """
+    Hashes a whole frame over the given columns, used as the global key a stage's outputs depend on.
+    """
+    row_hashes = pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+    return hashlib.sha256(np.sort(row_hashes).tobytes()).hexdigest()[:16]
+
+
+def load_stage_state(stage: str, state_dir: str) -> tuple:
+    """
+    Reads a stage's saved global key, per-player fingerprints and outputs, or (None, None, None) if absent.
+    """
+    meta_path = os.path.join(state_dir, f"{stage}_meta.json")
+    if not os.path.exists(meta_path):
+        return None, None, None
+
+    with open(meta_path) as f:
+        meta = json.load(f)
+    fingerprints = pd.read_parquet(os.path.join(state_dir, f"{stage}_fingerprints.parquet"))["fingerprint"]
+    outputs = [pd.read_parquet(os.path.join(state_dir, f"{stage}_output_{i}.parquet")) for i in range(meta["n_outputs"])]
+    return meta["global_key"], fingerprints, outputs
+
+
+def save_stage_state(stage: str, state_dir: str, global_key: str, fingerprints: pd.Series, outputs: list) -> None:
+    """
+    Persists a stage's global key, per-player fingerprints and outputs for the next incremental run.
+    """
+    os.makedirs(state_dir, exist_ok=True)
+    fingerprints.rename("fingerprint").to_frame().to_parquet(os.path.join(state_dir, f"{stage}_fingerprints.parquet"))
+    for i, output in enumerate(outputs):
+        output.to_parquet(os.path.join(state_dir, f"{stage}_output_{i}.parquet"))
+    with open(os.path.join(state_dir, f"{stage}_meta.json"), "w") as f:
+        json.dump({"global_key": global_key, "n_outputs": len(outputs)}, f)
+
+
+def run_stage(stage: str, inputs: pd.DataFrame, columns: list, compute, global_key: str, state_dir: str) -> tuple:
+    """
+    Runs compute on only the players whose input rows changed since the last run, reusing saved rows for the rest.
+    Every output frame must carry a player_id column. If global_key differs from the saved one, every player is recomputed.
+    Returns the merged outputs, ordered by each player's first appearance in inputs, and the recomputed player_ids.
+    """
+    fingerprints = player_fingerprints(inputs, columns)
+    saved_key, saved_fingerprints, saved_outputs = load_stage_state(stage, state_dir)
+
+    if saved_fingerprints is None or saved_key != global_key:
+        dirty_ids = fingerprints.index
+    else:
+        previous = saved_fingerprints.reindex(fingerprints.index)
+        dirty_ids = fingerprints.index[previous.isna().to_numpy() | (previous.to_numpy() != fingerprints.to_numpy())]
+
+    dirty_inputs = inputs[inputs["player_id"].isin(dirty_ids)]
+    fresh = compute(dirty_inputs) if not dirty_inputs.empty else None
+    if fresh is not None and isinstance(fresh, pd.DataFrame):
+        fresh = (fresh,)
+
+    n_outputs = len(fresh) if fresh is not None else len(saved_outputs or [])
+    clean_ids = fingerprints.index.difference(dirty_ids)
+    order = pd.Series(np.arange(len(fingerprints)), index=pd.unique(inputs["player_id"]))
+
+    merged = []
+    for i in range(n_outputs):
+        parts = []
+        if saved_outputs is not None and len(clean_ids):
+            parts.append(saved_outputs[i][saved_outputs[i]["player_id"].isin(clean_ids)])
+        if fresh is not None and not fresh[i].empty:
+            parts.append(fresh[i])
+        parts = [part for part in parts if not part.empty]
+        if not parts:
+            merged.append(pd.DataFrame())
+            continue
+
+        output = pd.concat(parts, ignore_index=True)
+        output = output.iloc[np.argsort(output["player_id"].map(order).to_numpy(), kind="stable")]
+        merged.append(output.reset_index(drop=True))
+
+    save_stage_state(stage, state_dir, global_key, fingerprints, merged)
+    return tuple(merged), dirty_ids
+
+
+def attach_player_ids(projection_df: pd.DataFrame, candidate_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Adds player_id to a projection table, which only carries candidate names, using the candidates it was built from.
+    """
+    if projection_df.empty:
+        return projection_df
+    ids = candidate_df.drop_duplicates(subset="last_name, first_name").set_index("last_name, first_name")["player_id"]
+    projection_df = projection_df.copy()
+    projection_df.insert(0, "player_id", projection_df["last_name, first_name"].map(ids))
+    return projection_df
+
+
+def run_incremental(breakout_candidates_df: pd.DataFrame, reference_df: pd.DataFrame, full_data: pd.DataFrame,
+                    state_dir: str = STATE_DIR, trajectories=None, weighting: dict = None) -> tuple:
+    """
+    Incremental version of the weight -> score -> match/project stages of main.py.
+    Each stage fingerprints its per-player inputs and only recomputes players whose inputs changed. Scoring also
+    reruns in full when the reference pool changes, and projection when any reference player's career changes.
+    weighting holds calculate_weighted_averages options; changing them reweights every player.
+    Returns (scored_df, hist_proj_df, reg_proj_df) with the same columns as a full run.
+    """
+    weighting = {key: value for key, value in (weighting or {}).items() if value is not None}
+    candidate_columns = ["player_id", "last_name, first_name", "year"] + METRICS
+    if weighting.get("volume_column"):
+        candidate_columns.append(weighting["volume_column"])
+
+    (weighted_df,), _ = run_stage(
+        "weighted", breakout_candidates_df, candidate_columns,
+        lambda subset: calculate_weighted_averages(subset, **weighting),
+        global_key=json.dumps(weighting, sort_keys=True) if weighting else "", state_dir=state_dir
+    )
+
+    reference_key = frame_fingerprint(reference_df, ["player_id", "last_name, first_name", "year"] + METRICS)
+    scorer = SuperstarScorer.cached(reference_df)
+    (scored_df,), _ = run_stage(
+        "scored", weighted_df, ["player_id", "last_name, first_name"] + METRICS,
+        lambda subset: compute_similarity_and_breakout(subset, scorer=scorer),
+        global_key=reference_key, state_dir=state_dir
+    )
+
+    # Comp careers extend past the reference window, so hash every season of every reference player
+    reference_careers = full_data[full_data["player_id"].isin(reference_df["player_id"].unique())]
+    careers_key = frame_fingerprint(reference_careers, ["player_id", "last_name, first_name", "year"] + METRICS)
+
+    def project(subset):
+        hist_proj_df, reg_proj_df = match_and_project(subset, reference_df, full_data, trajectories=trajectories)
+        return attach_player_ids(hist_proj_df, subset), attach_player_ids(reg_proj_df, subset)
+
+    (hist_proj_df, reg_proj_df), dirty_ids = run_stage(
+        "projected", scored_df, ["player_id", "last_name, first_name"] + METRICS,
+        project, global_key=reference_key + careers_key, state_dir=state_dir
+    )
+    print(f"Recomputed projections for {len(dirty_ids)} of {scored_df['player_id'].nunique()} candidates.")
+
+    hist_proj_df = hist_proj_df.drop(columns="player_id", errors="ignore")
+    reg_proj_df = reg_proj_df.drop(columns="player_id", errors="ignore")
+    return scored_df, hist_proj_df, reg_proj_df
@@ -1,43 +1,168 @@
+import argparse
+
 from data_loader import load_local_batting_data
 from candidate_filter import filter_breakout_candidates
 from weighted_metrics import calculate_weighted_averages
-from similarity_and_breakout import compute_similarity_and_breakout
+from similarity_and_breakout import compute_similarity_and_breakout, SuperstarScorer
 from projections import (
     match_and_project,
+    match_and_project_ensemble,
     build_projection_reference
     )
+from incremental import run_incremental
+from comp_index import CompIndex
+from trajectories import CareerTrajectories
+from projection_writer import stream_projections
+from parallel_projections import parallel_match_and_project
+from profiling import StageProfiler
+from rank_table import build_rank_table, RANK_TABLE_PATH
+from app_bundle import write_app_bundle, STREAM_DIR
 
 import pandas as pd
 
-# Load Data
-print("Loading Statcast data...")
-batting_df = load_local_batting_data()
 
-# Filter for Breakout Candidates
-print("Filtering breakout candidates (players who debuted in 2023 or 2024)...")
-breakout_candidates_df = filter_breakout_candidates(batting_df)
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the MLB breakout candidate pipeline.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only recompute players whose inputs changed since the last incremental run")
+    parser.add_argument("--ensemble-k", type=int, default=0,
+                        help="Also project each candidate from their K closest distinct comps (mean and percentile bands)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Write projections to disk block by block (CSV and Parquet) instead of all at the end")
+    parser.add_argument("--chunk-size", type=int, default=1000,
+                        help="Candidates per projection block in --stream mode")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes for the match-and-project stage (0 = one per CPU core)")
+    parser.add_argument("--half-life", type=float,
+                        help="Weight every recent season by exponential decay with this half-life (in seasons) "
+                             "instead of the fixed 2023/2024 weights")
+    parser.add_argument("--seasons", type=int,
+                        help="With --half-life, only weight the last N seasons")
+    parser.add_argument("--weight-by", metavar="COLUMN",
+                        help="Also weight each season by a playing-time column, e.g. pa")
+    parser.add_argument("--report", metavar="PATH",
+                        help="Write a JSON run report with per-stage wall time, peak RSS growth and row counts")
+    parser.add_argument("--cprofile-dir", metavar="DIR",
+                        help="Also run each stage under cProfile and dump its stats to DIR/<stage>.prof")
+    args = parser.parse_args()
+    if args.incremental and (args.stream or args.workers != 1):
+        parser.error("--incremental projects changed players in this process; it cannot be combined with --stream "
+                     "or --workers")
+    return args
+
+
+def main(args):
+    profiler = StageProfiler(cprofile_dir=args.cprofile_dir)
+    weighting = {"half_life": args.half_life, "n_seasons": args.seasons, "volume_column": args.weight_by}
+
+    # Load Data
+    print("Loading Statcast data...")
+    with profiler.stage("load_local_batting_data") as stage:
+        batting_df = load_local_batting_data()
+        stage["rows_out"] = len(batting_df)
+
+    # Filter for Breakout Candidates
+    print("Filtering breakout candidates (players who debuted in 2023 or 2024)...")
+    with profiler.stage("filter_breakout_candidates", rows_in=len(batting_df)) as stage:
+        breakout_candidates_df = filter_breakout_candidates(batting_df)
+        stage["rows_out"] = len(breakout_candidates_df)
+
+    # Filter for reference players
+    print("Preparing reference dataset of established players...")
+    with profiler.stage("build_projection_reference", rows_in=len(batting_df)) as stage:
+        reference_df = build_projection_reference(batting_df)
+        stage["rows_out"] = len(reference_df)
+
+    # Persist a comp index over the reference pool for the app and ad-hoc lookups
+    print("Building comp index over the reference pool...")
+    with profiler.stage("build_comp_index", rows_in=len(reference_df)) as stage:
+        CompIndex(reference_df).save()
+        stage["rows_out"] = len(reference_df)
+
+    # Precompute every reference player's career trajectory once for all projections
+    print("Precomputing career trajectories for reference players...")
+    with profiler.stage("build_career_trajectories", rows_in=len(batting_df)) as stage:
+        trajectories = CareerTrajectories.from_history(batting_df, player_ids=reference_df["player_id"].unique())
+        trajectories.save()
+        stage["rows_out"] = len(trajectories.player_ids)
+
+    if args.incremental:
+        # Weight, score and project only the players whose inputs changed
+        print("Updating weighted averages, scores and projections for changed players...")
+        with profiler.stage("run_incremental", rows_in=len(breakout_candidates_df)) as stage:
+            scored_df, hist_proj_df, reg_proj_df = run_incremental(breakout_candidates_df, reference_df, batting_df,
+                                                                   trajectories=trajectories, weighting=weighting)
+            stage["rows_out"] = len(hist_proj_df) + len(reg_proj_df)
+    else:
+        # Calculate Weighted Averages
+        print("Calculating weighted averages for recent seasons...")
+        with profiler.stage("calculate_weighted_averages", rows_in=len(breakout_candidates_df)) as stage:
+            weighted_df = calculate_weighted_averages(breakout_candidates_df, **weighting)
+            stage["rows_out"] = len(weighted_df)
+
+        # Compute Breakout Scores
+        print("Computing similarity and breakout scores...")
+        with profiler.stage("compute_similarity_and_breakout", rows_in=len(weighted_df)) as stage:
+            scored_df = compute_similarity_and_breakout(weighted_df, scorer=SuperstarScorer.cached(reference_df))
+            stage["rows_out"] = len(scored_df)
+
+        # Match and Project
+        print("Matching breakout candidates to historical comps and projecting future performance...")
+        with profiler.stage("match_and_project", rows_in=len(scored_df)) as stage:
+            if args.stream:
+                hist_rows, reg_rows = stream_projections(scored_df, reference_df, batting_df,
+                                                         chunk_size=args.chunk_size, trajectories=trajectories,
+                                                         arrow_dir=STREAM_DIR)
+                print(f"Streamed {hist_rows} historical and {reg_rows} regression projection rows to disk.")
+            elif args.workers != 1:
+                hist_proj_df, reg_proj_df = parallel_match_and_project(scored_df, reference_df, batting_df,
+                                                                       workers=args.workers or None,
+                                                                       trajectories=trajectories)
+            else:
+                hist_proj_df, reg_proj_df = match_and_project(scored_df, reference_df, batting_df, trajectories=trajectories)
+            stage["rows_out"] = hist_rows + reg_rows if args.stream else len(hist_proj_df) + len(reg_proj_df)
 
-# Calculate Weighted Averages
-print("Calculating weighted averages for recent seasons...")
-weighted_df = calculate_weighted_averages(breakout_candidates_df)
+    if args.ensemble_k:
+        print(f"Projecting candidates from their {args.ensemble_k} closest historical comps...")
+        with profiler.stage("match_and_project_ensemble", rows_in=len(scored_df)) as stage:
+            ensemble_proj_df, comps_df = match_and_project_ensemble(scored_df, reference_df, batting_df, k=args.ensemble_k,
+                                                                   trajectories=trajectories)
+            stage["rows_out"] = len(ensemble_proj_df)
 
-# Filter for reference players
-print("Preparing reference dataset of established players...")
-reference_df = build_projection_reference(batting_df)
+    # Export Results
+    print("Exporting results to CSV for use in Streamlit app...")
+    with profiler.stage("export_csv") as stage:
+        scored_df.to_csv("breakout_candidate_metrics.csv", index=False)
+        rank_table = build_rank_table(scored_df)
+        rank_table.to_csv(RANK_TABLE_PATH, index=False)
+        stage["rows_out"] = len(scored_df)
+        if args.incremental or not args.stream:
+            hist_proj_df.to_csv("historic_projected_breakouts.csv", index=False)
+            reg_proj_df.to_csv("linear_reg_projected_breakouts.csv", index=False)
+            stage["rows_out"] += len(hist_proj_df) + len(reg_proj_df)
+        if args.ensemble_k:
+            ensemble_proj_df.to_csv("ensemble_projected_breakouts.csv", index=False)
+            comps_df.to_csv("breakout_comps.csv", index=False)
+            stage["rows_out"] += len(ensemble_proj_df) + len(comps_df)
 
-# Compute Breakout Scores
-print("Computing similarity and breakout scores...")
-scored_df = compute_similarity_and_breakout(weighted_df, reference_df)
+    # Bundle every table the app reads, with display names, for memory-mapped loading
+    print("Writing app bundle...")
+    with profiler.stage("export_app_bundle", rows_in=len(scored_df)) as stage:
+        if args.stream and not args.incremental:
+            # The projection tables were written to the bundle's layout block by block while streaming
+            write_app_bundle(scored_df, None, None, rank_table, streamed_dir=STREAM_DIR)
+            stage["rows_out"] = len(scored_df) + hist_rows + reg_rows
+        else:
+            write_app_bundle(scored_df, hist_proj_df, reg_proj_df, rank_table)
+            stage["rows_out"] = len(scored_df) + len(hist_proj_df) + len(reg_proj_df)
 
-# Match and Project
-print("Matching breakout candidates to historical comps and projecting future performance...")
-hist_proj_df, reg_proj_df = match_and_project(scored_df, reference_df, batting_df)
+    print("All files successfully saved.")
 
-# Export Results
-print("Exporting results to CSV for use in Streamlit app...")
+    if args.report:
+        profiler.write_report(args.report)
+        print(profiler.summary())
+        print(f"Run report written to {args.report}.")
 
-scored_df.to_csv("breakout_candidate_metrics.csv", index=False)
-hist_proj_df.to_csv("historic_projected_breakouts.csv", index=False)
-reg_proj_df.to_csv("linear_reg_projected_breakouts.csv", index=False)
 
-print("All files successfully saved.")
+if __name__ == "__main__":
+    main(parse_args())
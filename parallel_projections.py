@@ -0,0 +1,97 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import pandas as pd
+import numpy as np
+
+from data_loader import METRICS
+from projections import rank_sum_best_match, fit_linear_trends, project_from_matches
+from trajectories import CareerTrajectories
+
+# Views onto the shared arrays, attached once per worker process by attach_shared_arrays
+WORKER_ARRAYS = {}
+
+
+def share_arrays(arrays: dict) -> tuple:
+    """
+    Copies each array into its own shared memory block.
+    Returns the blocks (the caller must close and unlink them) and the specs workers need to attach.
+    """
+    blocks, specs = [], {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        blocks.append(block)
+        specs[name] = (block.name, array.shape, array.dtype.str)
+    return blocks, specs
+
+
+def attach_shared_arrays(specs: dict) -> None:
+    """
+    Process pool initializer: maps every shared block into this worker as a read-only NumPy view.
+    """
+    for name, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        view = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        view.flags.writeable = False
+        WORKER_ARRAYS[name] = view
+        WORKER_ARRAYS[f"_{name}_block"] = block
+
+
+def match_shard(bounds: tuple) -> np.ndarray:
+    """
+    Matches candidates[start:stop] against the shared reference arrays.
+    Returns each candidate's best reference position (-1 where it has missing metrics).
+    """
+    start, stop = bounds
+    return rank_sum_best_match(WORKER_ARRAYS["candidates"][start:stop], WORKER_ARRAYS["reference"])
+
+
+def parallel_match_and_project(candidate_df: pd.DataFrame, reference_df: pd.DataFrame, full_data: pd.DataFrame,
+                               workers: int = None, shard_size: int = None,
+                               trajectories: CareerTrajectories = None, first_year: int = 2025) -> tuple:
+    """
+    Process-pool version of match_and_project with identical output.
+    Candidate and reference arrays are placed in shared memory once; tasks only carry a (start, stop) shard of
+    candidate rows and return its comp positions, reassembled in candidate order. The projection tables are then
+    built from those comps by project_from_matches, exactly as match_and_project builds them.
+    """
+    workers = workers or os.cpu_count()
+    reference_ids = reference_df["player_id"].unique()
+    if trajectories is None:
+        trajectories = CareerTrajectories.from_history(full_data, player_ids=reference_ids, metrics=METRICS)
+    trends = fit_linear_trends(full_data, METRICS, player_ids=reference_ids)
+
+    candidate_values = candidate_df[METRICS].to_numpy(dtype=np.float64)
+    blocks, specs = share_arrays({
+        "candidates": candidate_values,
+        "reference": reference_df[METRICS].to_numpy(dtype=np.float64),
+    })
+
+    n_candidates = len(candidate_df)
+    shard_size = shard_size or max(1, -(-n_candidates // (workers * 4)))
+    shards = [(start, min(start + shard_size, n_candidates)) for start in range(0, n_candidates, shard_size)]
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=attach_shared_arrays, initargs=(specs,)) as pool:
+            results = list(pool.map(match_shard, shards))
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    if not results:
+        return pd.DataFrame(), pd.DataFrame()
+    best_positions = np.concatenate(results)
+    matched = best_positions >= 0
+    if not matched.any():
+        return pd.DataFrame(), pd.DataFrame()
+
+    names = candidate_df["last_name, first_name"].to_numpy(dtype=object)[matched]
+    match_ids = reference_df["player_id"].to_numpy(dtype=object)[best_positions[matched]]
+    match_names = reference_df["last_name, first_name"].to_numpy(dtype=object)[best_positions[matched]]
+
+    return project_from_matches(names, candidate_values[matched], match_ids, match_names, full_data,
+                                trajectories=trajectories, trends=trends, first_year=first_year)
@@ -0,0 +1,143 @@
+import os
+
+import pandas as pd
+import numpy as np
+
+PLAYER_INDEX_FILE = "player_index.parquet"
+PLAYER_INDEX_PATH = os.path.join(".cache", PLAYER_INDEX_FILE)
+
+# Bumped whenever normalize_names changes, so persisted name keys are rebuilt instead of reused
+NORMALIZATION_VERSION = 1
+
+# Generational suffixes dropped from names before matching ("Acuña Jr., Ronald" and "Ronald Acuna" are one player)
+NAME_SUFFIXES = {"jr", "sr", "ii", "iii", "iv", "v"}
+
+# Largest accepted gap, in years, between a player's birth year and the one a supplemental age implies.
+# Supplemental ages are current ages rather than ages in season, which alone shifts older seasons by a year or two
+BIRTH_YEAR_TOLERANCE = 3
+
+
+def normalize_names(names: pd.Series) -> pd.Series:
+    """
+    Canonical form of each name, for "Last, First" and "First Last" alike: accents folded to ASCII, lower case,
+    periods and apostrophes removed, suffixes and middle initials dropped, "first last" order.
+    The string work runs once per distinct name.
+    """
+    codes, uniques = pd.factorize(names.astype(object))
+    flipped = pd.Series(uniques, dtype=object).str.split(", ").str[::-1].str.join(" ")
+    folded = (flipped.str.normalize("NFKD").str.encode("ascii", "ignore").str.decode("ascii")
+              .str.lower().str.replace(r"[.'’]", "", regex=True).str.replace(r"[^a-z0-9]+", " ", regex=True))
+
+    def canonical(name):
+        tokens = [token for token in name.split() if token not in NAME_SUFFIXES]
+        return " ".join(tokens[:1] + [token for token in tokens[1:-1] if len(token) > 1] + tokens[1:][-1:])
+
+    normalized = folded.map(canonical).to_numpy(dtype=object)
+    return pd.Series(normalized[codes] if len(codes) else normalized[:0], index=names.index)
+
+
+def name_keys(names: pd.Series) -> np.ndarray:
+    """
+    64-bit hash of each normalized name, the key the player index and supplemental rows are joined on.
+    """
+    return pd.util.hash_array(normalize_names(names).to_numpy(dtype=object))
+
+
+def build_player_index(batting_df: pd.DataFrame, index: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    One row per player_id: the name its key was built from, name_key, normalization_version and birth_year (median of
+    season minus player_age over seasons with a known age).
+    Pass a previously built index to hash names only for players that are new, were renamed, or were keyed by an older
+    NORMALIZATION_VERSION; birth years are always recomputed since they are cheap numeric aggregates.
+    """
+    players = batting_df.drop_duplicates(subset="player_id")[["player_id", "last_name, first_name"]]
+    names = players["last_name, first_name"].to_numpy(dtype=object)
+    if index is not None and not index.empty and {"name", "normalization_version"} <= set(index.columns):
+        positions = pd.Index(index["player_id"]).get_indexer(players["player_id"])
+        known = positions >= 0
+        reusable = np.zeros(len(players), dtype=bool)
+        reusable[known] = ((index["name"].to_numpy(dtype=object)[positions[known]] == names[known])
+                           & (index["normalization_version"].to_numpy()[positions[known]] == NORMALIZATION_VERSION))
+        keys = index["name_key"].to_numpy(dtype=np.uint64)[np.where(reusable, positions, 0)]
+        keys[~reusable] = name_keys(players.loc[~reusable, "last_name, first_name"])
+    else:
+        keys = name_keys(players["last_name, first_name"])
+
+    age_known = batting_df["player_age"].notna()
+    birth_years = (batting_df["year"] - batting_df["player_age"])[age_known].groupby(
+        batting_df.loc[age_known, "player_id"].to_numpy()).median()
+
+    return pd.DataFrame({
+        "player_id": players["player_id"].to_numpy(dtype=object),
+        "name": names,
+        "name_key": keys,
+        "normalization_version": NORMALIZATION_VERSION,
+        "birth_year": players["player_id"].map(birth_years).to_numpy(dtype=np.float64),
+    })
+
+
+def load_player_index(path: str = PLAYER_INDEX_PATH) -> pd.DataFrame:
+    """
+    Reads the persisted player index, or None if there is none yet.
+    """
+    return pd.read_parquet(path) if os.path.exists(path) else None
+
+
+def save_player_index(index: pd.DataFrame, path: str = PLAYER_INDEX_PATH) -> None:
+    """
+    Persists the player index (write then rename so readers never see a partial file).
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    index.to_parquet(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def keep_closest(matches: pd.DataFrame, keys: list, candidate: str) -> pd.DataFrame:
+    """
+    Keeps the smallest-birth_gap rows of every keys group, dropping groups where those rows disagree on candidate.
+    """
+    matches = matches[matches["birth_gap"] == matches.groupby(keys)["birth_gap"].transform("min")]
+    return matches[matches.groupby(keys)[candidate].transform("nunique") == 1]
+
+
+def resolve_supplemental_ages(supp_df: pd.DataFrame, index: pd.DataFrame, player_seasons: pd.DataFrame = None,
+                              tolerance: float = BIRTH_YEAR_TOLERANCE) -> pd.DataFrame:
+    """
+    Resolves supplemental (first_last_name, year, age_supplement) rows to player_id with vectorized key lookups.
+    Rows for one name in one season (a traded player's stints with each team) collapse when their ages agree.
+    A row can only go to a player whose birth year is within tolerance of the one it implies (season minus age), or whose
+    birth year is unknown. When several players share a name key the closest known birth year wins, then a player with
+    no known birth year; every player competes, so a namesake's row is never handed to the wrong player.
+    Only the player-seasons in player_seasons (player_id, year; default all) are returned, and a player-season matched by
+    rows with different ages keeps the closest one; ties are left out rather than guessed.
+    The listed age is the player's current age, not their age that season, so a player with a known birth year gets
+    season minus birth year instead; the listed age is only used as is when the birth year is unknown.
+    Returns one (player_id, year, age_supplement) row per resolved player-season.
+    """
+    if supp_df.empty or index is None or index.empty:
+        return pd.DataFrame(columns=["player_id", "year", "age_supplement"])
+
+    supp = pd.DataFrame({
+        "name_key": name_keys(supp_df["first_last_name"]),
+        "year": supp_df["year"].to_numpy(),
+        "age_supplement": supp_df["age_supplement"].to_numpy(dtype=np.float64),
+    }).dropna(subset=["age_supplement"]).drop_duplicates()
+
+    matches = supp.merge(index[["name_key", "player_id", "birth_year"]], on="name_key")
+    matches["birth_gap"] = (matches["year"] - matches["age_supplement"] - matches["birth_year"]).abs()
+    matches = matches[~(matches["birth_gap"] > tolerance)]
+
+    # An unknown birth year ranks behind every accepted known one
+    matches["birth_gap"] = matches["birth_gap"].fillna(tolerance + 1)
+
+    # Each supplemental row keeps its closest player, then each requested player-season keeps its closest age;
+    # ties drop out
+    matches = keep_closest(matches, ["name_key", "year", "age_supplement"], "player_id")
+    matches["age_supplement"] = (matches["year"] - matches["birth_year"]).round().fillna(matches["age_supplement"])
+    matches = matches.drop_duplicates(subset=["player_id", "year", "age_supplement"])
+    if player_seasons is not None:
+        matches = matches.merge(player_seasons[["player_id", "year"]].drop_duplicates(), on=["player_id", "year"])
+    matches = keep_closest(matches, ["player_id", "year"], "age_supplement")
+
+    return matches[["player_id", "year", "age_supplement"]].drop_duplicates(subset=["player_id", "year"]).reset_index(drop=True)
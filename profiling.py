@@ -0,0 +1,145 @@
+import cProfile
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+MAXRSS_TO_MB = 1 / (1024 * 1024) if sys.platform == "darwin" else 1 / 1024
+
+
+STATM_PATH = "/proc/self/statm"
+
+# Seconds between RSS samples while a stage runs
+RSS_SAMPLE_INTERVAL = 0.005
+
+
+def peak_rss_mb() -> float:
+    """
+    Peak resident set size of this process so far, in MB.
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * MAXRSS_TO_MB
+
+
+def current_rss_mb() -> float:
+    """
+    Current resident set size of this process in MB, or None where /proc is not available.
+    """
+    try:
+        with open(STATM_PATH) as f:
+            resident_pages = int(f.read().split()[1])
+    except OSError:
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+class RSSSampler:
+    """
+    Polls current RSS on a background thread and keeps the highest value seen, so a block's own peak can be measured
+    even after earlier work has raised the process's lifetime high-water mark.
+    Without /proc, peak is the lifetime high-water mark (ru_maxrss) instead.
+    """
+
+    def __init__(self, interval: float = RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.start_mb = current_rss_mb()
+        self.peak = self.start_mb
+        self.done = threading.Event()
+        self.thread = None
+
+    def start(self) -> None:
+        if self.start_mb is None:
+            self.start_mb = self.peak = peak_rss_mb()
+            return
+        self.thread = threading.Thread(target=self.poll, daemon=True)
+        self.thread.start()
+
+    def poll(self) -> None:
+        while not self.done.wait(self.interval):
+            self.peak = max(self.peak, current_rss_mb())
+
+    def stop(self) -> float:
+        """
+        Stops sampling and returns the peak RSS in MB.
+        """
+        if self.thread is None:
+            self.peak = max(self.peak, peak_rss_mb())
+            return self.peak
+        self.done.set()
+        self.thread.join()
+        self.peak = max(self.peak, current_rss_mb())
+        return self.peak
+
+
+class StageProfiler:
+    """
+    Records wall time, peak RSS growth and input/output row counts for each pipeline stage.
+    A stage's peak RSS is sampled while it runs (see RSSSampler), so peak_rss_delta_mb is how far that stage alone
+    pushed memory above where it started, not the change in the process's lifetime high-water mark.
+    When cprofile_dir is set, each stage also runs under cProfile and its stats are dumped to <cprofile_dir>/<stage>.prof.
+    """
+
+    def __init__(self, cprofile_dir: str = None):
+        self.cprofile_dir = cprofile_dir
+        self.stages = []
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str, rows_in: int = None):
+        """
+        Times the enclosed block. Set record["rows_out"] inside the block to log the stage's output size.
+        """
+        record = {"stage": name, "rows_in": rows_in, "rows_out": None}
+        profiler = cProfile.Profile() if self.cprofile_dir else None
+        sampler = RSSSampler()
+        sampler.start()
+        start = time.perf_counter()
+        if profiler:
+            profiler.enable()
+        try:
+            yield record
+        finally:
+            if profiler:
+                profiler.disable()
+            record["wall_seconds"] = round(time.perf_counter() - start, 6)
+            stage_peak = sampler.stop()
+            record["start_rss_mb"] = round(sampler.start_mb, 2)
+            record["peak_rss_mb"] = round(stage_peak, 2)
+            record["peak_rss_delta_mb"] = round(stage_peak - sampler.start_mb, 2)
+            if profiler:
+                os.makedirs(self.cprofile_dir, exist_ok=True)
+                record["cprofile"] = os.path.join(self.cprofile_dir, f"{name}.prof")
+                profiler.dump_stats(record["cprofile"])
+            self.stages.append(record)
+
+    def report(self) -> dict:
+        """
+        The run report: every stage record plus total wall time and the process's overall peak RSS.
+        """
+        return {
+            "total_wall_seconds": round(time.perf_counter() - self.started, 6),
+            "peak_rss_mb": round(peak_rss_mb(), 2),
+            "stages": self.stages,
+        }
+
+    def write_report(self, path: str) -> None:
+        """
+        Writes the run report as JSON.
+        """
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+    def summary(self) -> str:
+        """
+        One line per stage, for printing at the end of a run.
+        """
+        lines = [f"{'stage':<32}{'seconds':>10}{'peak RSS +MB':>14}{'rows in':>10}{'rows out':>10}"]
+        for record in self.stages:
+            rows_in = "" if record["rows_in"] is None else record["rows_in"]
+            rows_out = "" if record["rows_out"] is None else record["rows_out"]
+            lines.append(f"{record['stage']:<32}{record['wall_seconds']:>10.3f}{record['peak_rss_delta_mb']:>14.1f}"
+                         f"{rows_in:>10}{rows_out:>10}")
+        return "\n".join(lines)
@@ -0,0 +1,71 @@
+import pandas as pd
+import plotly.graph_objects as go
+
+# Chart label of every projected metric, in dropdown order
+METRIC_LABELS = {
+    'exit_velocity_avg': 'Avg Exit Velocity (mph)',
+    'launch_angle_avg': 'Avg Launch Angle (°)',
+    'barrel_batted_rate': 'Barrel Rate (%)',
+    'hard_hit_percent': 'Hard Hit %',
+    'xwoba': 'xwOBA',
+    'xba': 'xBA',
+    'xslg': 'xSLG'
+}
+
+
+def group_by_player(proj_df: pd.DataFrame) -> dict:
+    """
+    Splits a projection table into one frame per player ("last_name, first_name"), in a single grouped pass,
+    so looking up a player's projection is a dict access instead of a scan of the whole table.
+    """
+    if proj_df.empty:
+        return {}
+    return {name: group.reset_index(drop=True)
+            for name, group in proj_df.groupby('last_name, first_name', sort=False, observed=True)}
+
+
+def projection_figure(projections: dict, player_name: str, metric_labels: dict = METRIC_LABELS) -> go.Figure:
+    """
+    One interactive figure holding every metric for every projection type in projections (e.g. {"Historical": df,
+    "Regression": df}): a dropdown switches the metric and the legend toggles projection types, both in the browser.
+    Returns None if every projection is empty.
+    """
+    projections = {kind: df for kind, df in projections.items() if not df.empty}
+    if not projections:
+        return None
+
+    fig = go.Figure()
+    for i, metric in enumerate(metric_labels):
+        for kind, df in projections.items():
+            comp = df['match_first_last_name'].iloc[0] if 'match_first_last_name' in df.columns else None
+            fig.add_trace(go.Scatter(
+                x=df['year'],
+                y=df[metric],
+                mode='lines+markers',
+                name=kind,
+                legendgroup=kind,
+                visible=i == 0,
+                hovertemplate=f"{kind}" + (f" (comp: {comp})" if comp else "") + ": %{y:.3f}<extra></extra>",
+            ))
+
+    # Each dropdown entry shows its metric's traces and retitles the chart, without a round trip to the server
+    n_kinds = len(projections)
+    buttons = []
+    for i, (metric, label) in enumerate(metric_labels.items()):
+        visible = [j // n_kinds == i for j in range(len(metric_labels) * n_kinds)]
+        buttons.append(dict(label=label, method='update', args=[
+            {'visible': visible},
+            {'title.text': f"{label} Projection for {player_name}", 'yaxis.title.text': label},
+        ]))
+
+    first_label = next(iter(metric_labels.values()))
+    fig.update_layout(
+        title=dict(text=f"{first_label} Projection for {player_name}"),
+        xaxis=dict(title=dict(text='Year'), dtick=1),
+        yaxis=dict(title=dict(text=first_label)),
+        hovermode='x unified',
+        legend=dict(title=dict(text='Projection')),
+        updatemenus=[dict(buttons=buttons, direction='down', showactive=True, x=0, xanchor='left', y=1.2, yanchor='top')],
+        margin=dict(t=100),
+    )
+    return fig
@@ -0,0 +1,89 @@
+import os
+from functools import lru_cache
+
+import pandas as pd
+import numpy as np
+
+from data_loader import load_local_batting_data, METRICS
+from weighted_metrics import calculate_weighted_averages, SEASON_WEIGHTS
+from projections import build_projection_reference, fit_linear_trends, project_from_matches
+from comp_index import CompIndex, COMP_INDEX_PATH
+from trajectories import CareerTrajectories, TRAJECTORIES_PATH
+
+
+class ProjectionService:
+    """
+    Projects any player on demand with match_and_project's rules: the comp is the reference row with the lowest summed
+    metric rank (read from a presorted CompIndex), the historical path follows the comp's precomputed career trajectory
+    and the regression path the comp's precomputed linear trend.
+    Results are kept in an LRU cache of cache_size players, so repeat lookups cost nothing; treat them as read-only.
+    """
+
+    def __init__(self, comp_index: CompIndex, trajectories: CareerTrajectories, full_data: pd.DataFrame,
+                 cache_size: int = 512):
+        self.comp_index = comp_index
+        self.trajectories = trajectories
+        self.full_data = full_data
+        self.trends = fit_linear_trends(full_data, METRICS, player_ids=pd.unique(comp_index.player_ids))
+        # Enough comps to still have one left after dropping every reference row of the player being projected
+        self.comp_depth = int(pd.Series(comp_index.player_ids).value_counts().max()) + 1 if len(comp_index) else 1
+        self.project_values = lru_cache(maxsize=cache_size)(self._project_values)
+        self.project_player = lru_cache(maxsize=cache_size)(self._project_player)
+
+    @classmethod
+    def from_artifacts(cls, batting_path: str = "batting.csv", comp_index_path: str = COMP_INDEX_PATH,
+                       trajectories_path: str = TRAJECTORIES_PATH, cache_size: int = 512) -> "ProjectionService":
+        """
+        Builds the service from the cached batting data and the comp index and trajectories main.py saved,
+        building the index and trajectories here if a previous run has not left them.
+        """
+        full_data = load_local_batting_data(batting_path)
+        if os.path.exists(comp_index_path) and os.path.exists(trajectories_path):
+            return cls(CompIndex.load(comp_index_path), CareerTrajectories.load(trajectories_path), full_data, cache_size)
+
+        reference_df = build_projection_reference(full_data)
+        trajectories = CareerTrajectories.from_history(full_data, player_ids=reference_df["player_id"].unique())
+        return cls(CompIndex(reference_df), trajectories, full_data, cache_size)
+
+    def _project_values(self, name: str, values: tuple, first_year: int = 2025, player_id: str = None) -> tuple:
+        """
+        Projects one player from their (weighted) metric values, given in METRICS order, labelling the projections as
+        the seasons from first_year. The player's own reference seasons (player_id) are never their comp.
+        Returns (hist_proj_df, reg_proj_df) in match_and_project's layout; both are empty if no comp is found.
+        """
+        values = np.asarray(values, dtype=np.float64)[None, :]
+        positions, _ = self.comp_index.query_rank(values, k=self.comp_depth)
+        positions = positions[0][positions[0] >= 0]
+        positions = positions[self.comp_index.player_ids[positions] != player_id]
+        if not len(positions):
+            return pd.DataFrame(), pd.DataFrame()
+        best = positions[0]
+
+        return project_from_matches(np.array([name], dtype=object), values,
+                                    self.comp_index.player_ids[[best]], self.comp_index.names[[best]],
+                                    self.full_data, trajectories=self.trajectories, trends=self.trends,
+                                    first_year=first_year)
+
+    def _project_player(self, player_id: str) -> tuple:
+        """
+        Projects a player from their own latest seasons, weighted as the pipeline weights 2023/2024 but shifted to end
+        at the player's last season, with projections starting the season after it. For players whose last season is
+        2024 this is exactly the pipeline's projection.
+        Returns empty frames if the player is not in the batting data.
+        """
+        seasons = self.full_data[self.full_data["player_id"] == str(player_id)]
+        if seasons.empty:
+            return pd.DataFrame(), pd.DataFrame()
+        shift = int(seasons["year"].max()) - max(SEASON_WEIGHTS)
+        weighted = calculate_weighted_averages(
+            seasons, season_weights={year + shift: weight for year, weight in SEASON_WEIGHTS.items()})
+        row = weighted.iloc[0]
+        return self.project_values(row["last_name, first_name"], tuple(row[METRICS]),
+                                   max(SEASON_WEIGHTS) + shift + 1, str(player_id))
+
+    def project_candidate(self, candidate: pd.Series) -> tuple:
+        """
+        Projects one row of a scored candidates table.
+        """
+        return self.project_values(candidate["last_name, first_name"], tuple(candidate[METRICS].astype(float)),
+                                   player_id=candidate.get("player_id"))
@@ -0,0 +1,97 @@
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from projections import iter_match_and_project
+from app_bundle import add_display_names
+
+
+class ProjectionWriter:
+    """
+    Appends projection blocks to a CSV and, optionally, a Parquet file and an Arrow IPC file as they are produced.
+    The CSV is flushed after every block, so an interrupted run leaves every completed block readable on disk.
+    The Parquet file gets one row group per block and is finalized on close. The Arrow file holds the blocks with
+    display names added, as app_bundle.write_app_bundle lays out its tables, so the bundle can be built without
+    reading the projections back.
+    Outputs left by an earlier run are removed up front, so a run that writes no rows never leaves stale files behind.
+    """
+
+    def __init__(self, csv_path: str, parquet_path: str = None, arrow_path: str = None):
+        self.csv_path = csv_path
+        self.parquet_path = parquet_path
+        self.arrow_path = arrow_path
+        self.parquet_writer = None
+        self.arrow_writer = None
+        self.arrow_schema = None
+        self.rows = 0
+        for path in (csv_path, parquet_path, arrow_path):
+            if path and os.path.exists(path):
+                os.remove(path)
+
+    def write(self, block: pd.DataFrame) -> None:
+        if block.empty:
+            return
+
+        with open(self.csv_path, "a", newline="") as f:
+            block.to_csv(f, index=False, header=self.rows == 0)
+            f.flush()
+
+        if self.parquet_path:
+            table = pa.Table.from_pandas(block, preserve_index=False)
+            if self.parquet_writer is None:
+                self.parquet_writer = pq.ParquetWriter(self.parquet_path, table.schema)
+            self.parquet_writer.write_table(table.cast(self.parquet_writer.schema))
+
+        if self.arrow_path:
+            table = pa.Table.from_pandas(add_display_names(block), preserve_index=False)
+            if self.arrow_writer is None:
+                os.makedirs(os.path.dirname(self.arrow_path) or ".", exist_ok=True)
+                self.arrow_schema = table.schema
+                self.arrow_writer = pa.ipc.new_file(self.arrow_path, table.schema)
+            self.arrow_writer.write_table(table.cast(self.arrow_schema))
+
+        self.rows += len(block)
+
+    def close(self) -> None:
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+            self.parquet_writer = None
+        if self.arrow_writer is not None:
+            self.arrow_writer.close()
+            self.arrow_writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def stream_projections(candidate_df: pd.DataFrame, reference_df: pd.DataFrame, full_data: pd.DataFrame,
+                       hist_path: str = "historic_projected_breakouts.csv",
+                       reg_path: str = "linear_reg_projected_breakouts.csv",
+                       chunk_size: int = 1000, write_parquet: bool = True, trajectories=None,
+                       arrow_dir: str = None, first_year: int = 2025) -> tuple:
+    """
+    Projects candidates block by block and writes each block as soon as it is ready, instead of holding every
+    projection in memory until the end. Parquet copies are written next to each CSV when write_parquet is set, and
+    app bundle tables (historic.arrow, regression.arrow) to arrow_dir when it is given.
+    Returns the number of (historical, regression) rows written.
+    """
+    def parquet_path(csv_path):
+        return os.path.splitext(csv_path)[0] + ".parquet" if write_parquet else None
+
+    def arrow_path(table):
+        return os.path.join(arrow_dir, f"{table}.arrow") if arrow_dir else None
+
+    with ProjectionWriter(hist_path, parquet_path(hist_path), arrow_path("historic")) as hist_writer, \
+            ProjectionWriter(reg_path, parquet_path(reg_path), arrow_path("regression")) as reg_writer:
+        for hist_block, reg_block in iter_match_and_project(candidate_df, reference_df, full_data,
+                                                            chunk_size=chunk_size, trajectories=trajectories,
+                                                            first_year=first_year):
+            hist_writer.write(hist_block)
+            reg_writer.write(reg_block)
+
+    return hist_writer.rows, reg_writer.rows
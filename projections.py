@@ -1,126 +1,332 @@
-from sklearn.linear_model import LinearRegression
 import pandas as pd
 import numpy as np
 
-def build_projection_reference(df: pd.DataFrame) -> pd.DataFrame:
+from data_loader import METRICS
+from trajectories import CareerTrajectories
+
+def build_projection_reference(df: pd.DataFrame, before_year: int = 2024, window_years: int = 6, min_seasons: int = 4) -> pd.DataFrame:
     """
-    Builds a reference dataset of established players who had their first four seasons
-    within any 5-year span before 2024. These players are used for comparison against breakout candidates.
+    Builds a reference dataset of established players who logged at least min_seasons seasons within some span of
+    window_years calendar years (a start year through start + window_years - 1) before before_year.
+    These players are used for comparison against breakout candidates.
+    Eligibility is a sliding-window count over every player's sorted seasons, computed with one searchsorted.
     """
-    df_pre_2024 = df[df["year"] < 2024].copy()
+    df_pre_cutoff = df[df["year"] < before_year].copy()
+
+    seasons = df_pre_cutoff[["player_id", "year"]].drop_duplicates()
+    player_codes, player_ids = pd.factorize(seasons["player_id"])
+    years = seasons["year"].to_numpy(dtype=np.int64)
+
+    # Offset each player's seasons far enough apart that a window can never reach the next player
+    spacing = int(years.max() - years.min()) + window_years + 1 if len(years) else 1
+    keys = np.sort(player_codes.astype(np.int64) * spacing + (years - (years.min() if len(years) else 0)))
 
-    eligible_ids = []
-    for player_id, group in df_pre_2024.groupby("player_id"):
-        years = sorted(group["year"].unique())
-        # Look for any span of 5 years containing at least 4 seasons
-        for i in range(len(years)):
-            window = [y for y in years if years[i] <= y < years[i] + 6]
-            if len(window) >= 4:
-                eligible_ids.append(player_id)
-                break
+    # For every season, count the player's seasons from that year up to the end of the window
+    window_end = np.searchsorted(keys, keys + window_years, side="left")
+    in_window = window_end - np.arange(len(keys))
+    eligible_codes = np.unique(keys[in_window >= min_seasons] // spacing)
+    eligible_ids = player_ids[eligible_codes]
 
-    reference_df = df_pre_2024[df_pre_2024["player_id"].isin(eligible_ids)].copy()
+    reference_df = df_pre_cutoff[df_pre_cutoff["player_id"].isin(eligible_ids)].copy()
     reference_df = reference_df.sort_values(by=["last_name, first_name", "year"]).reset_index(drop=True)
 
     return reference_df
 
 
-def match_and_project(candidate_df: pd.DataFrame, reference_df: pd.DataFrame, full_data: pd.DataFrame) -> pd.DataFrame:
+def iter_rank_sum_blocks(candidate_values: np.ndarray, reference_values: np.ndarray, max_block_cells: int = 4_000_000):
+    """
+    Yields (candidate rows, summed rank matrix) blocks for every candidate without missing metrics.
+    Each metric is ranked by absolute difference to the candidate with rank(method='min') semantics.
+    Candidates are processed in blocks so no matrix holds more than max_block_cells entries.
+    """
+    candidate_values = np.asarray(candidate_values, dtype=np.float64)
+    reference_values = np.asarray(reference_values, dtype=np.float64)
+    n_metrics = candidate_values.shape[1]
+    n_reference = reference_values.shape[0]
+    if n_reference == 0:
+        return
+
+    valid_rows = np.flatnonzero(~np.isnan(candidate_values).any(axis=1))
+    block_size = max(1, max_block_cells // n_reference)
+    positions = np.arange(n_reference)
+
+    for start in range(0, len(valid_rows), block_size):
+        rows = valid_rows[start:start + block_size]
+        total_rank = np.zeros((len(rows), n_reference), dtype=np.float64)
+
+        for m in range(n_metrics):
+            diffs = np.abs(reference_values[:, m][None, :] - candidate_values[rows, m][:, None])
+
+            # Min-rank: every member of a tie group gets the 1-based position of the group's first element
+            order = np.argsort(diffs, axis=1, kind="stable")
+            sorted_diffs = np.take_along_axis(diffs, order, axis=1)
+            new_value = np.ones(sorted_diffs.shape, dtype=bool)
+            new_value[:, 1:] = sorted_diffs[:, 1:] != sorted_diffs[:, :-1]
+            group_start = np.maximum.accumulate(np.where(new_value, positions, 0), axis=1)
+
+            ranks = np.empty_like(diffs)
+            np.put_along_axis(ranks, order, group_start + 1.0, axis=1)
+            total_rank += ranks
+
+        yield rows, total_rank
+
+
+def rank_sum_best_match(candidate_values: np.ndarray, reference_values: np.ndarray, max_block_cells: int = 4_000_000) -> np.ndarray:
+    """
+    Finds the reference row with the lowest summed per-metric rank distance for every candidate at once.
+    The first row holding the lowest total wins, mirroring idxmin on the per-candidate rank sum.
+    Returns positional indices into reference_values, -1 where a candidate has missing metrics.
+    """
+    best_idx = np.full(len(candidate_values), -1, dtype=np.int64)
+    for rows, total_rank in iter_rank_sum_blocks(candidate_values, reference_values, max_block_cells):
+        best_idx[rows] = np.argmin(total_rank, axis=1)
+    return best_idx
+
+
+def rank_sum_top_k_players(candidate_values: np.ndarray, reference_values: np.ndarray, reference_player_ids,
+                           k: int = 25, max_block_cells: int = 4_000_000) -> tuple:
+    """
+    Finds the k closest distinct players for every candidate. Each player is scored by their best reference
+    season's rank total, so a player never competes against their own other seasons.
+    Ties go to the player whose best season comes first in reference_values, consistent with rank_sum_best_match.
+    Returns (positions, totals), each (n_candidates, k): the reference row of each comp's best season and its
+    rank total. Unfilled slots (missing metrics, or fewer than k players) are -1 / NaN.
+    """
+    n_reference = len(reference_values)
+    player_codes, _ = pd.factorize(np.asarray(reference_player_ids, dtype=object))
+    n_players = int(player_codes.max()) + 1 if n_reference else 0
+    k_found = min(k, n_players)
+
+    positions = np.full((len(candidate_values), k), -1, dtype=np.int64)
+    totals = np.full((len(candidate_values), k), np.nan)
+    if k_found == 0:
+        return positions, totals
+
+    by_player = np.argsort(player_codes, kind="stable")
+    starts = np.flatnonzero(np.r_[True, np.diff(player_codes[by_player]) != 0])
+
+    for rows, total_rank in iter_rank_sum_blocks(candidate_values, reference_values, max_block_cells):
+        # Fold the row position into the score so one min per player yields both its best total and earliest row
+        keys = total_rank * n_reference + np.arange(n_reference)
+        player_best = np.minimum.reduceat(keys[:, by_player], starts, axis=1)
+
+        top = np.argpartition(player_best, k_found - 1, axis=1)[:, :k_found] if k_found < n_players else \
+            np.tile(np.arange(n_players), (len(rows), 1))
+        top_keys = np.take_along_axis(player_best, top, axis=1)
+        top_keys.sort(axis=1)
+
+        positions[rows, :k_found] = (top_keys % n_reference).astype(np.int64)
+        totals[rows, :k_found] = top_keys // n_reference
+
+    return positions, totals
+
+
+def fit_linear_trends(history: pd.DataFrame, metrics: list, player_ids=None) -> tuple:
+    """
+    Fits an ordinary least-squares line of each metric against year for every player's career in one vectorized pass.
+    Only players with at least two distinct seasons are fitted, matching what a per-player LinearRegression would accept.
+    Returns (slopes, intercepts) DataFrames indexed by player_id with one column per metric.
+    """
+    history = history.drop_duplicates(subset=['player_id', 'year'])
+    if player_ids is not None:
+        history = history[history['player_id'].isin(player_ids)]
+    history = history.sort_values(['player_id', 'year'])
+
+    ids, starts, counts = np.unique(history['player_id'].to_numpy(), return_index=True, return_counts=True)
+    keep = counts >= 2
+    if not keep.any():
+        empty = pd.DataFrame(columns=metrics, dtype=float)
+        return empty, empty.copy()
+
+    x = history['year'].to_numpy(dtype=np.float64)
+    y = history[metrics].to_numpy(dtype=np.float64)
+
+    # Center within each career so the sums stay well conditioned for calendar years
+    x_mean = np.add.reduceat(x, starts) / counts
+    y_mean = np.add.reduceat(y, starts, axis=0) / counts[:, None]
+    group = np.repeat(np.arange(len(ids)), counts)
+    x_centered = x - x_mean[group]
+    y_centered = y - y_mean[group]
+
+    sxx = np.add.reduceat(x_centered ** 2, starts)
+    sxy = np.add.reduceat(x_centered[:, None] * y_centered, starts, axis=0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slopes = sxy / sxx[:, None]
+    intercepts = y_mean - slopes * x_mean[:, None]
+
+    slopes_df = pd.DataFrame(slopes[keep], index=ids[keep], columns=metrics)
+    intercepts_df = pd.DataFrame(intercepts[keep], index=ids[keep], columns=metrics)
+    return slopes_df, intercepts_df
+
+
+def project_linear_trends(rows: list, full_data: pd.DataFrame, metrics: list, trends: tuple = None,
+                          first_year: int = 2025) -> pd.DataFrame:
+    """
+    Builds the regression projection table for (candidate name, match name, match player_id) rows.
+    Trends are fitted once per distinct comp and evaluated for the 4 years from first_year - 1, labelled as the
+    4 seasons from first_year (by default evaluated for 2024-2027, labelled 2025-2028).
+    Pass trends from fit_linear_trends to reuse fits across calls instead of fitting from full_data.
+    """
+    columns = ['year', 'last_name, first_name', 'match_name'] + metrics
+    if not rows:
+        return pd.DataFrame()
+
+    names, match_names, match_ids = (np.asarray(col, dtype=object) for col in zip(*rows))
+    if trends is None:
+        trends = fit_linear_trends(full_data, metrics, player_ids=np.unique(match_ids))
+    slopes, intercepts = trends
+
+    has_trend = pd.Index(slopes.index).get_indexer(match_ids) >= 0
+    if not has_trend.any():
+        return pd.DataFrame()
+    names, match_names, match_ids = names[has_trend], match_names[has_trend], match_ids[has_trend]
+
+    fit_years = np.arange(first_year - 1, first_year + 3, dtype=np.float64)
+    slope_rows = slopes.loc[match_ids].to_numpy()
+    intercept_rows = intercepts.loc[match_ids].to_numpy()
+    preds = intercept_rows[:, None, :] + slope_rows[:, None, :] * fit_years[None, :, None]
+
+    horizon = len(fit_years)
+    reg_proj_df = pd.DataFrame(preds.reshape(-1, len(metrics)), columns=metrics)
+    reg_proj_df.insert(0, 'year', np.tile(np.arange(first_year, first_year + horizon), len(names)))
+    reg_proj_df.insert(1, 'last_name, first_name', np.repeat(names, horizon))
+    reg_proj_df.insert(2, 'match_name', np.repeat(match_names, horizon))
+    return reg_proj_df[columns]
+
+
+def match_and_project_ensemble(candidate_df: pd.DataFrame, reference_df: pd.DataFrame, full_data: pd.DataFrame,
+                               k: int = 25, percentiles: tuple = (10, 50, 90),
+                               trajectories: CareerTrajectories = None, first_year: int = 2025) -> tuple:
+    """
+    Matches each breakout candidate to its k closest distinct reference players (by summed metric rank) and
+    projects the next 4 seasons along every comp's historical trajectory at once.
+    Pass prebuilt CareerTrajectories covering the reference players to skip building them here.
+    Projections are labelled as the seasons from first_year (default 2025), as in match_and_project.
+    Returns (ensemble_df, comps_df): the mean and percentile bands per metric per year, one row per
+    candidate/year/stat, and the comps used, one row per candidate/comp.
+    """
+    candidate_values = candidate_df[METRICS].to_numpy(dtype=np.float64)
+    positions, totals = rank_sum_top_k_players(candidate_values, reference_df[METRICS].to_numpy(dtype=np.float64),
+                                               reference_df['player_id'], k)
+    found = positions >= 0
+    matched = found.any(axis=1)
+    if not matched.any():
+        return pd.DataFrame(), pd.DataFrame()
+
+    # Trajectory steps come from one precomputed array, gathered for every candidate/comp slot
+    comp_ids = np.where(found, reference_df['player_id'].to_numpy(dtype=object)[positions], None)
+    if trajectories is None:
+        trajectories = CareerTrajectories.from_history(full_data, player_ids=pd.unique(comp_ids[found]), metrics=METRICS)
+    horizon = trajectories.horizon
+    slots = trajectories.positions(comp_ids[matched].ravel()).reshape(-1, k)
+    slots[~found[matched]] = -1
+
+    paths = candidate_values[matched][:, None, None, :] + np.cumsum(trajectories.steps[slots], axis=2)
+    paths[slots < 0] = np.nan
+
+    # nanpercentile is a slow per-lane loop, so only use it for candidates with fewer than k comps
+    complete = (slots >= 0).all(axis=1)
+    bands = np.empty((len(percentiles),) + paths.shape[:1] + paths.shape[2:])
+    bands[:, complete] = np.percentile(paths[complete], percentiles, axis=1)
+    if not complete.all():
+        bands[:, ~complete] = np.nanpercentile(paths[~complete], percentiles, axis=1)
+
+    stats = {'mean': np.nanmean(paths, axis=1)}
+    for pct, band in zip(percentiles, bands):
+        stats[f'p{pct:g}'] = band
+
+    # Lay out rows as candidate -> year -> stat, keeping candidate order
+    bands = np.stack(list(stats.values())).transpose(1, 2, 0, 3)
+    names = candidate_df['last_name, first_name'].to_numpy()[matched]
+    n_matched, n_stats = len(names), len(stats)
+    ensemble_df = pd.DataFrame(bands.reshape(-1, len(METRICS)), columns=METRICS)
+    ensemble_df.insert(0, 'last_name, first_name', np.repeat(names, horizon * n_stats))
+    ensemble_df.insert(1, 'year', np.tile(np.repeat(np.arange(first_year, first_year + horizon), n_stats), n_matched))
+    ensemble_df.insert(2, 'stat', np.tile(list(stats), n_matched * horizon))
+    ensemble_df.insert(3, 'n_comps', np.repeat(found[matched].sum(axis=1), horizon * n_stats))
+
+    rows, ranks = np.nonzero(found)
+    comps_df = pd.DataFrame({
+        'last_name, first_name': candidate_df['last_name, first_name'].to_numpy()[rows],
+        'comp_rank': ranks + 1,
+        'comp_player_id': reference_df['player_id'].to_numpy()[positions[rows, ranks]],
+        'comp_name': reference_df['last_name, first_name'].to_numpy()[positions[rows, ranks]],
+        'comp_year': reference_df['year'].to_numpy()[positions[rows, ranks]],
+        'rank_total': totals[rows, ranks],
+    })
+
+    return ensemble_df, comps_df
+
+
+def match_and_project(candidate_df: pd.DataFrame, reference_df: pd.DataFrame, full_data: pd.DataFrame,
+                      trajectories: CareerTrajectories = None, trends: tuple = None, first_year: int = 2025) -> pd.DataFrame:
     """
     Matches breakout candidates to the most similar player from the reference group
     using rank-based metric similarity. Projects their next 4 years using:
     1. Historical stat progression of the matched player
     2. Linear regression trend from the matched player's career
     Works even if candidate has only one year of data.
+    Pass prebuilt CareerTrajectories and fit_linear_trends output covering the reference players to skip building them here.
+    Projections are labelled as the 4 seasons from first_year (default 2025), e.g. first_year=2020 to replay an earlier season.
+    """
+    if trajectories is None or trends is None:
+        full_data = full_data.drop_duplicates(subset=['player_id', 'year'])
+    candidate_values = candidate_df[METRICS].to_numpy(dtype=np.float64)
+
+    # Stat-by-stat similarity ranking for every candidate in one batched pass
+    best_positions = rank_sum_best_match(candidate_values, reference_df[METRICS].to_numpy(dtype=np.float64))
+    matched = best_positions >= 0
+    if not matched.any():
+        return pd.DataFrame(), pd.DataFrame()
+
+    names = candidate_df['last_name, first_name'].to_numpy(dtype=object)[matched]
+    match_ids = reference_df['player_id'].to_numpy(dtype=object)[best_positions[matched]]
+    match_names = reference_df['last_name, first_name'].to_numpy(dtype=object)[best_positions[matched]]
+
+    return project_from_matches(names, candidate_values[matched], match_ids, match_names, full_data,
+                                trajectories=trajectories, trends=trends, first_year=first_year)
+
+
+def project_from_matches(names: np.ndarray, candidate_values: np.ndarray, match_ids: np.ndarray, match_names: np.ndarray,
+                         full_data: pd.DataFrame, trajectories: CareerTrajectories = None, trends: tuple = None,
+                         first_year: int = 2025) -> tuple:
+    """
+    The projection half of match_and_project, for candidates whose comps are already chosen: one row of
+    candidate_values, one comp player_id and one comp name per candidate name.
+    Returns (hist_proj_df, reg_proj_df) in match_and_project's layout.
     """
-    metrics = ['exit_velocity_avg', 'launch_angle_avg', 'barrel_batted_rate',
-               'hard_hit_percent', 'xwoba', 'xba', 'xslg']
-
-    projections_hist = []
-    projections_reg = []
-
-    full_data = full_data.drop_duplicates(subset=['player_id', 'year'])
-    
-    for _, candidate in candidate_df.iterrows():
-        try:
-            # Stat-by-stat similarity ranking
-            rank_scores = []
-            for metric in metrics:
-                diffs = (reference_df[metric] - candidate[metric]).abs()
-                ranks = diffs.rank(method='min')
-                rank_scores.append(ranks)
-
-            total_rank = sum(rank_scores)
-            best_match_idx = total_rank.idxmin()
-            best_match_id = reference_df.loc[best_match_idx, 'player_id']
-            match_name = reference_df.loc[best_match_idx, 'last_name, first_name']
-
-            # Get full career data for the best match
-            match_history = full_data[full_data['player_id'] == best_match_id].sort_values('year')
-            match_metrics = match_history[metrics + ['year']].copy()
-
-            # Check for duplicated index or year values
-            if match_metrics.index.duplicated().any():
-                print(f"Duplicate index detected for match: {match_name} (player_id: {best_match_id})")
-            if match_metrics['year'].duplicated().any():
-                print(f"Duplicate year rows found for match: {match_name} (player_id: {best_match_id})")
-
-            #Remove duplicate years before any indexing
-            match_metrics = match_metrics.drop_duplicates(subset='year').reset_index(drop=True)
-
-
-            # HISTORICAL PROJECTION
-            base_year = match_metrics['year'].min() + 1
-            base_metrics = match_metrics[match_metrics['year'] == base_year]
-            future_metrics = match_metrics[match_metrics['year'] > base_year].copy()
-
-            if not base_metrics.empty and not future_metrics.empty:
-                diffs = future_metrics[metrics].reset_index(drop=True) - base_metrics[metrics].values[0]
-                if len(diffs) < 4:
-                    last_diff = diffs.iloc[-1]
-                    extension = pd.DataFrame([last_diff] * (4 - len(diffs)))
-                    diffs = pd.concat([diffs, extension], ignore_index=True)
-                diffs = diffs.head(4)
-            else:
-                # fallback: use full-career year-to-year diffs
-                diffs = match_metrics[metrics].diff().dropna().reset_index(drop=True)
-                if not diffs.empty:
-                    last_diff = diffs.iloc[-1]
-                    extension = pd.DataFrame([last_diff] * 4)
-                    diffs = extension
-                else:
-                    diffs = pd.DataFrame(np.zeros((4, len(metrics))), columns=metrics)
-
-            # Build the projection
-            hist_proj = pd.DataFrame()
-            hist_proj['year'] = [2025 + i for i in range(4)]
-            for metric in metrics:
-                hist_proj[metric] = candidate[metric] + diffs[metric].cumsum()
-
-            # Add identifying info
-            hist_proj.insert(0, 'last_name, first_name', candidate['last_name, first_name'])
-            hist_proj.insert(1, 'match_name', match_name)
-            projections_hist.append(hist_proj)
-
-            # REGRESSION PROJECTION
-            if len(match_metrics) >= 2:
-                reg_proj = pd.DataFrame()
-                reg_proj['year'] = [2025 + i for i in range(4)]
-                reg_proj['last_name, first_name'] = candidate['last_name, first_name']
-                reg_proj['match_name'] = match_name
-
-                for metric in metrics:
-                    lr = LinearRegression()
-                    X = match_metrics[['year']]
-                    y = match_metrics[[metric]]
-                    lr.fit(X, y)
-                    future_years = pd.DataFrame({'year': [2024 + i for i in range(4)]})
-                    reg_proj[metric] = lr.predict(future_years).flatten()
-
-                projections_reg.append(reg_proj)
-        except Exception as e:
-            continue
-
-    hist_proj_df = pd.concat(projections_hist, ignore_index=True) if projections_hist else pd.DataFrame()
-    reg_proj_df = pd.concat(projections_reg, ignore_index=True) if projections_reg else pd.DataFrame()
+    # HISTORICAL PROJECTION: candidate's metrics plus the comp's accumulated career steps
+    if trajectories is None:
+        trajectories = CareerTrajectories.from_history(full_data, player_ids=pd.unique(match_ids), metrics=METRICS)
+    horizon = trajectories.horizon
+    paths = trajectories.project(candidate_values, match_ids)
+
+    hist_proj_df = pd.DataFrame(paths.reshape(-1, len(METRICS)), columns=METRICS)
+    hist_proj_df.insert(0, 'last_name, first_name', np.repeat(names, horizon))
+    hist_proj_df.insert(1, 'match_name', np.repeat(match_names, horizon))
+    hist_proj_df.insert(2, 'year', np.tile(np.arange(first_year, first_year + horizon), len(names)))
+
+    # REGRESSION PROJECTION: one batched trend fit per distinct comp
+    reg_proj_df = project_linear_trends(list(zip(names, match_names, match_ids)), full_data, METRICS, trends=trends,
+                                        first_year=first_year)
+
     return hist_proj_df, reg_proj_df
+
+
+def iter_match_and_project(candidate_df: pd.DataFrame, reference_df: pd.DataFrame, full_data: pd.DataFrame,
+                           chunk_size: int = 1000, trajectories: CareerTrajectories = None, first_year: int = 2025):
+    """
+    Streaming form of match_and_project: yields (hist_proj_df, reg_proj_df) for consecutive blocks of
+    chunk_size candidates, so memory stays bounded by one block however many candidates there are.
+    Trajectories and regression trends are built once over the reference pool and shared by every block.
+    Concatenating the blocks gives the same tables as a single match_and_project call.
+    """
+    reference_ids = reference_df['player_id'].unique()
+    if trajectories is None:
+        trajectories = CareerTrajectories.from_history(full_data, player_ids=reference_ids, metrics=METRICS)
+    trends = fit_linear_trends(full_data, METRICS, player_ids=reference_ids)
+
+    for start in range(0, len(candidate_df), chunk_size):
+        yield match_and_project(candidate_df.iloc[start:start + chunk_size], reference_df, full_data,
+                                trajectories=trajectories, trends=trends, first_year=first_year)
@@ -0,0 +1,38 @@
+import pandas as pd
+import numpy as np
+
+from data_loader import to_first_last, METRICS
+
+RANK_TABLE_PATH = "breakout_rank_table.csv"
+
+# Every column the app ranks players by, highest first
+RANKED_COLUMNS = ['breakout_score', 'superstar_similarity', 'breakout_index'] + METRICS
+
+
+def build_rank_table(scored_df: pd.DataFrame, ranked_columns: list = RANKED_COLUMNS) -> pd.DataFrame:
+    """
+    One row per scored candidate, in scored_df order: its row position, display name and 1-based rank (highest first,
+    ties in row order, missing values last) for every ranked column, as <column>_rank.
+    """
+    table = pd.DataFrame({
+        'row': np.arange(len(scored_df)),
+        'last_name, first_name': scored_df['last_name, first_name'].to_numpy(),
+        'first_last_name': to_first_last(scored_df['last_name, first_name']).to_numpy(),
+    })
+    for column in ranked_columns:
+        if column in scored_df.columns:
+            ranks = scored_df[column].rank(method='first', ascending=False, na_option='bottom')
+            table[f'{column}_rank'] = ranks.to_numpy(dtype=np.int64)
+    return table
+
+
+def leaderboard_orders(rank_table: pd.DataFrame) -> dict:
+    """
+    For every <column>_rank in the table, the candidate row positions ordered from rank 1 down.
+    """
+    orders = {}
+    for rank_column in rank_table.columns[rank_table.columns.str.endswith('_rank')]:
+        order = np.empty(len(rank_table), dtype=np.int64)
+        order[rank_table[rank_column].to_numpy() - 1] = rank_table['row'].to_numpy()
+        orders[rank_column[:-len('_rank')]] = order
+    return orders
@@ -1,36 +1,130 @@
+import hashlib
+import os
+
 import pandas as pd
-from sklearn.preprocessing import StandardScaler
 import numpy as np
 
-def compute_similarity_and_breakout(candidate_df: pd.DataFrame, reference_df: pd.DataFrame) -> pd.DataFrame:
+from data_loader import METRICS
+
+SCORER_DIR = os.path.join(".cache", "scorer")
+
+# Bumped whenever the saved statistics or their meaning change, so older artifacts are refit instead of reused
+SCORER_VERSION = 1
+
+SUPERSTAR_QUANTILE = 0.95
+BREAKOUT_WEIGHT = 0.7
+SIMILARITY_WEIGHT = 0.3
+
+
+def reference_key(reference_df: pd.DataFrame, metrics: list = METRICS, superstar_quantile: float = SUPERSTAR_QUANTILE) -> str:
     """
-    Calculates the similarity of each breakout candidate to established players based on key metrics.
-    Generates a similarity score, breakout score, and overall breakout index.
+    Hashes the reference pool's metric values (in any row order) together with the metrics and quantile used.
     """
-    metrics = ['exit_velocity_avg', 'launch_angle_avg', 'barrel_batted_rate',
-               'hard_hit_percent', 'xwoba', 'xba', 'xslg']
+    row_hashes = pd.util.hash_pandas_object(reference_df[metrics], index=False).to_numpy()
+    digest = hashlib.sha256(np.sort(row_hashes).tobytes())
+    digest.update(repr((SCORER_VERSION, list(metrics), superstar_quantile)).encode())
+    return digest.hexdigest()[:16]
+
 
-    # Compute reference superstar threshold
-    superstar_thresholds = reference_df[metrics].quantile(0.95)
+class SuperstarScorer:
+    """
+    The reference statistics compute_similarity_and_breakout scores against: per-metric z-score mean and scale
+    (as sklearn's StandardScaler fits them) and the superstar centroid, the reference pool's superstar_quantile per metric.
+    Fit once per reference pool, then scoring any number of candidates is a single vectorized transform.
+    """
 
-    scaler = StandardScaler()
-    scaler.fit(reference_df[metrics])
+    def __init__(self, mean: np.ndarray, scale: np.ndarray, superstar: np.ndarray, metrics: list = METRICS,
+                 superstar_quantile: float = SUPERSTAR_QUANTILE, key: str = None):
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.superstar = np.asarray(superstar, dtype=np.float64)
+        self.metrics = list(metrics)
+        self.superstar_quantile = superstar_quantile
+        self.key = key
 
-    # Ensure candidate_df is transformed with a DataFrame having matching column names
-    candidate_scaled = scaler.transform(candidate_df[metrics])
-    superstar_scaled = scaler.transform(pd.DataFrame([superstar_thresholds], columns=metrics))[0]
+    @classmethod
+    def fit(cls, reference_df: pd.DataFrame, metrics: list = METRICS,
+            superstar_quantile: float = SUPERSTAR_QUANTILE) -> "SuperstarScorer":
+        """
+        Fits the scaler statistics and superstar centroid on the reference pool.
+        """
+        values = reference_df[metrics].to_numpy(dtype=np.float64)
+        mean = np.nanmean(values, axis=0)
 
-    # Similarity = negative euclidean distance
-    similarity_scores = -np.linalg.norm(candidate_scaled - superstar_scaled, axis=1)
-    candidate_df['superstar_similarity'] = similarity_scores
+        # Population standard deviation, with constant metrics left unscaled like StandardScaler
+        std = np.nanstd(values, axis=0)
+        scale = np.where(std < 10 * np.finfo(np.float64).eps, 1.0, std)
 
-    # Breakout score = average of metrics
-    candidate_df['breakout_score'] = candidate_df[metrics].mean(axis=1)
+        superstar = reference_df[metrics].quantile(superstar_quantile).to_numpy(dtype=np.float64)
+        return cls(mean, scale, superstar, metrics, superstar_quantile,
+                   key=reference_key(reference_df, metrics, superstar_quantile))
 
-    # Final breakout index
-    candidate_df['breakout_index'] = (
-        0.7 * candidate_df['breakout_score'] +
-        0.3 * candidate_df['superstar_similarity']
-    )
+    @classmethod
+    def cached(cls, reference_df: pd.DataFrame, metrics: list = METRICS, superstar_quantile: float = SUPERSTAR_QUANTILE,
+               cache_dir: str = SCORER_DIR) -> "SuperstarScorer":
+        """
+        Loads the scorer saved for this exact reference pool, or fits and saves it (replacing any older artifact).
+        """
+        key = reference_key(reference_df, metrics, superstar_quantile)
+        path = os.path.join(cache_dir, f"scorer_v{SCORER_VERSION}_{key}.npz")
+        if os.path.exists(path):
+            return cls.load(path)
 
-    return candidate_df
+        scorer = cls.fit(reference_df, metrics, superstar_quantile)
+        os.makedirs(cache_dir, exist_ok=True)
+        for name in os.listdir(cache_dir):
+            if name.startswith("scorer_") and name.endswith(".npz"):
+                os.remove(os.path.join(cache_dir, name))
+        scorer.save(path)
+        return scorer
+
+    def save(self, path: str) -> None:
+        """
+        Writes the statistics to an .npz file (write then rename so readers never see a partial file).
+        """
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, mean=self.mean, scale=self.scale, superstar=self.superstar, metrics=np.array(self.metrics),
+                 superstar_quantile=self.superstar_quantile, key=self.key or "", version=SCORER_VERSION)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "SuperstarScorer":
+        """
+        Reads statistics written by save, refusing artifacts from a different SCORER_VERSION.
+        """
+        with np.load(path) as data:
+            if int(data["version"]) != SCORER_VERSION:
+                raise ValueError(f"{path} was written by scorer version {int(data['version'])}, expected {SCORER_VERSION}.")
+            return cls(data["mean"], data["scale"], data["superstar"], list(data["metrics"]),
+                       float(data["superstar_quantile"]), key=str(data["key"]) or None)
+
+    def similarity(self, values: np.ndarray) -> np.ndarray:
+        """
+        Negative Euclidean distance from each row of values to the superstar centroid, in z-score space.
+        """
+        return -np.linalg.norm((values - self.superstar) / self.scale, axis=1)
+
+    def score(self, candidate_df: pd.DataFrame, breakout_weight: float = BREAKOUT_WEIGHT,
+              similarity_weight: float = SIMILARITY_WEIGHT) -> pd.DataFrame:
+        """
+        Returns a copy of candidate_df with superstar_similarity, breakout_score and breakout_index appended.
+        """
+        similarity = self.similarity(candidate_df[self.metrics].to_numpy(dtype=np.float64))
+        breakout_score = candidate_df[self.metrics].mean(axis=1)
+        return candidate_df.assign(
+            superstar_similarity=similarity,
+            breakout_score=breakout_score,
+            breakout_index=breakout_weight * breakout_score + similarity_weight * similarity,
+        )
+
+
+def compute_similarity_and_breakout(candidate_df: pd.DataFrame, reference_df: pd.DataFrame = None,
+                                    scorer: SuperstarScorer = None) -> pd.DataFrame:
+    """
+    Calculates the similarity of each breakout candidate to established players based on key metrics.
+    Generates a similarity score, breakout score, and overall breakout index.
+    Pass a fitted (or SuperstarScorer.cached) scorer to skip refitting on reference_df. candidate_df is not modified.
+    """
+    if scorer is None:
+        scorer = SuperstarScorer.fit(reference_df)
+    return scorer.score(candidate_df)
@@ -0,0 +1,228 @@
+import argparse
+import sys
+import time
+
+import pandas as pd
+import numpy as np
+
+from data_loader import load_local_batting_data, METRICS
+from candidate_filter import filter_breakout_candidates
+from projections import build_projection_reference
+from similarity_and_breakout import SuperstarScorer, BREAKOUT_WEIGHT, SIMILARITY_WEIGHT, SUPERSTAR_QUANTILE
+from weighted_metrics import SEASON_WEIGHTS
+
+GRID_COLUMNS = ['breakout_weight', 'similarity_weight', 'recent_weight', 'superstar_quantile']
+
+# The pipeline's own setting, which every swept setting's leaderboard is compared against
+BASELINE = {
+    'breakout_weight': BREAKOUT_WEIGHT,
+    'similarity_weight': SIMILARITY_WEIGHT,
+    'recent_weight': SEASON_WEIGHTS[max(SEASON_WEIGHTS)] / sum(SEASON_WEIGHTS.values()),
+    'superstar_quantile': SUPERSTAR_QUANTILE,
+}
+
+
+class SweepInputs:
+    """
+    The intermediates every setting is scored from, computed once: each candidate's metrics in the previous and latest
+    season as a (candidate, season, metric) array, which seasons they played, and the reference pool the superstar
+    centroid and z-score scale come from.
+    Candidates are in player_id order, as calculate_weighted_averages returns them.
+    """
+
+    def __init__(self, player_ids: np.ndarray, names: np.ndarray, values: np.ndarray, played: np.ndarray,
+                 reference_df: pd.DataFrame, metrics: list = METRICS):
+        self.player_ids = player_ids
+        self.names = names
+        self.values = values
+        self.played = played
+        self.reference_df = reference_df[metrics].reset_index(drop=True)
+        self.metrics = list(metrics)
+        self.scale = SuperstarScorer.fit(self.reference_df, metrics).scale
+
+    @classmethod
+    def from_batting(cls, batting_df: pd.DataFrame, latest_year: int = max(SEASON_WEIGHTS),
+                     metrics: list = METRICS) -> "SweepInputs":
+        """
+        Selects candidates and the reference pool exactly as main.py does and lays out their two weighted seasons.
+        """
+        seasons = np.array([latest_year - 1, latest_year])
+        candidates_df = filter_breakout_candidates(batting_df)
+        candidates_df = candidates_df[candidates_df['year'].isin(seasons)].drop_duplicates(subset=['player_id', 'year'])
+
+        codes, player_ids = pd.factorize(candidates_df['player_id'], sort=True)
+        season = np.searchsorted(seasons, candidates_df['year'].to_numpy())
+        values = np.full((len(player_ids), len(seasons), len(metrics)), np.nan)
+        values[codes, season] = candidates_df[metrics].to_numpy(dtype=np.float64)
+        played = np.zeros((len(player_ids), len(seasons)), dtype=bool)
+        played[codes, season] = True
+
+        names = candidates_df.drop_duplicates(subset='player_id').set_index('player_id')['last_name, first_name']
+        reference_df = build_projection_reference(batting_df, before_year=latest_year)
+        return cls(np.asarray(player_ids, dtype=object), names.reindex(player_ids).to_numpy(dtype=object),
+                   values, played, reference_df, metrics)
+
+    def weighted_averages(self, recent_weights: np.ndarray) -> np.ndarray:
+        """
+        (setting, candidate, metric) weighted averages with the latest season weighted recent_weight and the previous
+        one 1 - recent_weight, following calculate_weighted_averages: missing metrics drop out of their own weight and
+        candidates with no weighted season are all NaN.
+        """
+        weights = np.stack([1.0 - recent_weights, recent_weights], axis=1)[:, None, :, None]
+        present = ~np.isnan(self.values)
+        totals = (np.where(present, self.values, 0.0)[None] * weights).sum(axis=2)
+        metric_weights = (present[None] * weights).sum(axis=2)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = totals / metric_weights
+        weighted = (self.played[None] * weights[..., 0]).sum(axis=2) > 0
+        return np.where(weighted[..., None], means, np.nan)
+
+    def superstars(self, quantiles: np.ndarray) -> np.ndarray:
+        """
+        (quantile, metric) superstar centroids, computed as SuperstarScorer.fit does.
+        """
+        return self.reference_df.quantile(list(quantiles)).to_numpy(dtype=np.float64)
+
+
+def sweep_breakout_index(inputs: SweepInputs, breakout_weights, similarity_weights, recent_weights,
+                         superstar_quantiles) -> tuple:
+    """
+    Scores every candidate under every combination of the four parameter lists in one broadcasted computation:
+    weighted averages once per recent weight, superstar similarity once per (recent weight, quantile) and the breakout
+    index for all combinations from those.
+    Returns (grid, index): one grid row per setting (GRID_COLUMNS, in itertools.product order) and the
+    (setting, candidate) breakout index, NaN for candidates with no weighted season.
+    """
+    breakout_weights, similarity_weights, recent_weights, superstar_quantiles = (
+        np.asarray(values, dtype=np.float64) for values in (breakout_weights, similarity_weights, recent_weights,
+                                                            superstar_quantiles))
+
+    averages = inputs.weighted_averages(recent_weights)
+    superstars = inputs.superstars(superstar_quantiles)
+
+    # (recent weight, quantile, candidate) distance to each centroid, and (recent weight, candidate) mean metric
+    similarity = -np.linalg.norm((averages[:, None] - superstars[None, :, None]) / inputs.scale, axis=-1)
+    present = ~np.isnan(averages)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        breakout_score = np.where(present, averages, 0.0).sum(axis=-1) / present.sum(axis=-1)
+    breakout_score = np.where(present.any(axis=-1), breakout_score, np.nan)
+
+    index = (breakout_weights[:, None, None, None, None] * breakout_score[None, None, :, None, :]
+             + similarity_weights[None, :, None, None, None] * similarity[None, None])
+
+    axes = np.meshgrid(breakout_weights, similarity_weights, recent_weights, superstar_quantiles, indexing='ij')
+    grid = pd.DataFrame({column: axis.ravel() for column, axis in zip(GRID_COLUMNS, axes)})
+    return grid, index.reshape(len(grid), -1)
+
+
+def leaderboard_ranks(index: np.ndarray) -> np.ndarray:
+    """
+    1-based rank of every candidate in every setting's leaderboard, as build_rank_table ranks breakout_index:
+    highest first, ties in candidate order, missing values last.
+    """
+    order = np.argsort(np.where(np.isnan(index), np.inf, -index), axis=1, kind='stable')
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(1, index.shape[1] + 1)[None, :], axis=1)
+    return ranks
+
+
+def stability_report(grid: pd.DataFrame, ranks: np.ndarray, baseline_ranks: np.ndarray, names: np.ndarray,
+                     index: np.ndarray, top_n: int = 10) -> pd.DataFrame:
+    """
+    One row per setting comparing its leaderboard to the baseline's:
+    - top_n_overlap: share of the baseline top top_n that stays in the setting's top top_n
+    - spearman: rank correlation over every candidate
+    - mean_rank_shift / max_rank_shift: how far the baseline top top_n players move
+    - leader: the setting's number one
+    """
+    n_players = ranks.shape[1]
+    top_n = min(top_n, n_players)
+    baseline_top = baseline_ranks <= top_n
+    shifts = np.abs(ranks[:, baseline_top] - baseline_ranks[baseline_top])
+
+    report = grid.copy()
+    report['n_candidates'] = (~np.isnan(index)).sum(axis=1)
+    report['leader'] = names[np.argmin(ranks, axis=1)] if n_players else None
+    report[f'top_{top_n}_overlap'] = ((ranks <= top_n) & baseline_top).sum(axis=1) / max(top_n, 1)
+    report['spearman'] = 1 - 6 * ((ranks - baseline_ranks) ** 2).sum(axis=1) / max(n_players * (n_players ** 2 - 1), 1)
+    report['mean_rank_shift'] = shifts.mean(axis=1) if top_n else 0.0
+    report['max_rank_shift'] = shifts.max(axis=1) if top_n else 0
+    return report
+
+
+def player_stability(ranks: np.ndarray, baseline_ranks: np.ndarray, player_ids: np.ndarray, names: np.ndarray,
+                     top_n: int = 10) -> pd.DataFrame:
+    """
+    One row per candidate: baseline rank, best, median and worst rank over all settings and the share of settings
+    that put them in the top top_n, most consistently top-ranked first.
+    """
+    players = pd.DataFrame({
+        'player_id': player_ids,
+        'last_name, first_name': names,
+        'baseline_rank': baseline_ranks,
+        'best_rank': ranks.min(axis=0),
+        'median_rank': np.median(ranks, axis=0),
+        'worst_rank': ranks.max(axis=0),
+        f'top_{top_n}_share': (ranks <= top_n).mean(axis=0),
+    })
+    return players.sort_values([f'top_{top_n}_share', 'median_rank', 'baseline_rank'],
+                               ascending=[False, True, True]).reset_index(drop=True)
+
+
+def run_sweep(inputs: SweepInputs, breakout_weights, similarity_weights, recent_weights, superstar_quantiles,
+              top_n: int = 10) -> tuple:
+    """
+    Sweeps the grid and the baseline setting and returns (stability_report, player_stability).
+    """
+    grid, index = sweep_breakout_index(inputs, breakout_weights, similarity_weights, recent_weights, superstar_quantiles)
+    _, baseline_index = sweep_breakout_index(inputs, *([BASELINE[column]] for column in GRID_COLUMNS))
+    ranks = leaderboard_ranks(index)
+    baseline_ranks = leaderboard_ranks(baseline_index)[0]
+
+    return (stability_report(grid, ranks, baseline_ranks, inputs.names, index, top_n),
+            player_stability(ranks, baseline_ranks, inputs.player_ids, inputs.names, top_n))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Sweep the breakout index parameters and report leaderboard stability.")
+    parser.add_argument("--breakout-weights", type=float, nargs="+", default=[0.5, 0.6, 0.7, 0.8, 0.9],
+                        help="Weights on breakout_score in the breakout index")
+    parser.add_argument("--similarity-weights", type=float, nargs="+", default=[0.1, 0.2, 0.3, 0.4, 0.5],
+                        help="Weights on superstar_similarity in the breakout index")
+    parser.add_argument("--recent-weights", type=float, nargs="+", default=[0.5, 0.6, 0.7, 0.8],
+                        help="Weight of the latest season in the weighted averages (the previous season gets the rest)")
+    parser.add_argument("--superstar-quantiles", type=float, nargs="+", default=[0.9, 0.95, 0.99],
+                        help="Reference pool quantiles to use as the superstar centroid")
+    parser.add_argument("--top-n", type=int, default=10, help="Leaderboard size the stability measures compare")
+    parser.add_argument("--output", metavar="PATH", default="sweep_report.csv",
+                        help="Where to write the per-setting stability report")
+    parser.add_argument("--players-output", metavar="PATH", default="sweep_players.csv",
+                        help="Where to write the per-candidate rank ranges over all settings")
+    return parser.parse_args()
+
+
+def main(args):
+    print("Loading Statcast data...")
+    inputs = SweepInputs.from_batting(load_local_batting_data())
+
+    start = time.perf_counter()
+    report, players = run_sweep(inputs, args.breakout_weights, args.similarity_weights, args.recent_weights,
+                                args.superstar_quantiles, top_n=args.top_n)
+    elapsed = time.perf_counter() - start
+    print(f"Scored {len(inputs.player_ids):,} candidates under {len(report):,} settings in {elapsed:.3f}s.")
+
+    overlap = f"top_{min(args.top_n, len(inputs.player_ids))}_overlap"
+    print(f"\nLeast stable settings (by {overlap} with the baseline, then spearman):")
+    print(report.sort_values([overlap, "spearman"]).head(10).to_string(index=False))
+    print(f"\nMost consistently top-{args.top_n} candidates:")
+    print(players.head(args.top_n).to_string(index=False))
+
+    report.to_csv(args.output, index=False)
+    players.to_csv(args.players_output, index=False)
+    print(f"\nStability report written to {args.output} and {args.players_output}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args()))
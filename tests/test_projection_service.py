@@ -0,0 +1,36 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_loader import METRICS
+from projections import build_projection_reference
+from comp_index import CompIndex
+from trajectories import CareerTrajectories
+from projection_service import ProjectionService
+
+
+def make_batting(n_players: int = 12, years=range(2016, 2025), seed: int = 0) -> pd.DataFrame:
+    """
+    Synthetic batting data: every player has a season every year with random metrics.
+    """
+    rng = np.random.default_rng(seed)
+    rows = [{"player_id": str(1000 + i), "last_name, first_name": f"Player, {i}", "year": year,
+             "player_age": 25 + year - 2016, **dict(zip(METRICS, rng.random(len(METRICS))))}
+            for i in range(n_players) for year in years]
+    return pd.DataFrame(rows)
+
+
+def test_no_reference_player_is_their_own_comp():
+    full_data = make_batting()
+    reference_df = build_projection_reference(full_data)
+    trajectories = CareerTrajectories.from_history(full_data, player_ids=reference_df["player_id"].unique())
+    service = ProjectionService(CompIndex(reference_df), trajectories, full_data)
+
+    for player_id, name in reference_df.drop_duplicates("player_id")[["player_id", "last_name, first_name"]].values:
+        hist_proj_df, _ = service.project_player(player_id)
+        assert not hist_proj_df.empty
+        assert (hist_proj_df["match_name"] != name).all()
@@ -0,0 +1,37 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from weighted_metrics import calculate_weighted_averages
+
+
+def test_half_life_decays_from_each_players_last_season():
+    # Player 2 stopped playing two seasons before player 1's latest season
+    df = pd.DataFrame({
+        "player_id": ["1", "1", "2", "2", "2"],
+        "last_name, first_name": ["One, Player", "One, Player", "Two, Player", "Two, Player", "Two, Player"],
+        "year": [2023, 2024, 2020, 2021, 2022],
+        "xwoba": [0.300, 0.400, 0.200, 0.300, 0.400],
+    })
+    weighted = calculate_weighted_averages(df, half_life=1.0, n_seasons=2, metrics=["xwoba"]).set_index("player_id")
+
+    # Each player's last two seasons, the latest weighted twice the one before it
+    assert np.isclose(weighted.loc["1", "xwoba"], (0.300 + 2 * 0.400) / 3)
+    assert np.isclose(weighted.loc["2", "xwoba"], (0.300 + 2 * 0.400) / 3)
+
+
+def test_half_life_latest_year_is_shared():
+    df = pd.DataFrame({
+        "player_id": ["1", "1", "2"],
+        "last_name, first_name": ["One, Player", "One, Player", "Two, Player"],
+        "year": [2023, 2024, 2022],
+        "xwoba": [0.300, 0.400, 0.200],
+    })
+    weighted = calculate_weighted_averages(df, half_life=1.0, n_seasons=2, latest_year=2024, metrics=["xwoba"])
+
+    # Player 2's only season is outside the last two seasons before 2024
+    assert weighted["player_id"].tolist() == ["1"]
@@ -0,0 +1,113 @@
+import pandas as pd
+import numpy as np
+
+from data_loader import METRICS
+
+TRAJECTORIES_PATH = "career_trajectories.npz"
+
+
+class CareerTrajectories:
+    """
+    Aligned career arrays for a set of players, built once per run and shared by every projection.
+    careers holds each player's seasons as (player, career season, metric), NaN-padded past their last season,
+    and steps holds the per-year increments the historical projection accumulates over the horizon:
+    - Each season after a player's second one minus that second season, padded with the last value to the horizon
+    - If there is no consecutive second season or nothing after it, the last year-over-year change, repeated
+    - Zeros for single-season players
+    A historical projection from a comp is then base_values + steps[comp].cumsum(axis=0).
+    """
+
+    def __init__(self, player_ids, years: np.ndarray, careers: np.ndarray, lengths: np.ndarray,
+                 metrics: list = METRICS, horizon: int = 4):
+        self.player_ids = pd.Index(player_ids)
+        self.years = years
+        self.careers = careers
+        self.lengths = lengths
+        self.metrics = list(metrics)
+        self.horizon = horizon
+        self.steps = self.compute_steps()
+
+    @classmethod
+    def from_history(cls, full_data: pd.DataFrame, player_ids=None, metrics: list = METRICS, horizon: int = 4) -> "CareerTrajectories":
+        """
+        Builds the arrays from per-season rows (player_id, year, metrics), optionally for a subset of players.
+        The first row per (player_id, year) wins, as in match_and_project.
+        """
+        history = full_data.drop_duplicates(subset=['player_id', 'year'])
+        if player_ids is not None:
+            history = history[history['player_id'].isin(player_ids)]
+        history = history.sort_values(['player_id', 'year'], kind='stable')
+
+        codes, ids = pd.factorize(history['player_id'], sort=True)
+        lengths = np.bincount(codes, minlength=len(ids))
+        starts = np.r_[0, np.cumsum(lengths)[:-1]]
+        season = np.arange(len(codes)) - starts[codes]
+
+        width = int(lengths.max()) if len(lengths) else 1
+        careers = np.full((len(ids), width, len(metrics)), np.nan)
+        years = np.full((len(ids), width), -1, dtype=np.int64)
+        careers[codes, season] = history[metrics].to_numpy(dtype=np.float64)
+        years[codes, season] = history['year'].to_numpy()
+
+        return cls(ids, years, careers, lengths, metrics, horizon)
+
+    def compute_steps(self) -> np.ndarray:
+        """
+        Derives the (player, horizon, metric) projection increments from the aligned careers in one vectorized pass.
+        """
+        n_players = len(self.player_ids)
+        steps = np.zeros((n_players, self.horizon, len(self.metrics)))
+        if n_players == 0:
+            return steps
+
+        rows = np.arange(n_players)
+        last = self.lengths - 1
+
+        # Primary: second season exists (first year + 1) with at least one season after it
+        has_base = (self.lengths >= 2) & (self.years[:, min(1, self.years.shape[1] - 1)] == self.years[:, 0] + 1)
+        primary = has_base & (self.lengths >= 3)
+        if primary.any():
+            p = rows[primary]
+            horizon_seasons = np.minimum(2 + np.arange(self.horizon)[None, :], last[p][:, None])
+            steps[p] = self.careers[p[:, None], horizon_seasons] - self.careers[p, 1][:, None, :]
+
+        # Fallback: repeat the last year-over-year change
+        fallback = ~primary & (self.lengths >= 2)
+        if fallback.any():
+            f = rows[fallback]
+            last_change = self.careers[f, last[f]] - self.careers[f, last[f] - 1]
+            steps[f] = last_change[:, None, :]
+
+        return steps
+
+    def positions(self, player_ids) -> np.ndarray:
+        """
+        Row of each player_id in the arrays, -1 for players not present.
+        """
+        return self.player_ids.get_indexer(np.asarray(player_ids, dtype=object))
+
+    def project(self, base_values: np.ndarray, player_ids) -> np.ndarray:
+        """
+        Historical projection of base_values (n, metric) along each matching comp's trajectory: (n, horizon, metric).
+        """
+        positions = self.positions(player_ids)
+        if (positions < 0).any():
+            raise KeyError("Some comps are missing from these career trajectories; rebuild them over the reference pool.")
+        steps = self.steps[positions]
+        return np.asarray(base_values, dtype=np.float64)[:, None, :] + np.cumsum(steps, axis=1)
+
+    def save(self, path: str = TRAJECTORIES_PATH) -> None:
+        """
+        Writes the arrays to an .npz file.
+        """
+        np.savez(path, player_ids=self.player_ids.to_numpy(dtype=str), years=self.years, careers=self.careers,
+                 lengths=self.lengths, metrics=np.array(self.metrics), horizon=self.horizon)
+
+    @classmethod
+    def load(cls, path: str = TRAJECTORIES_PATH) -> "CareerTrajectories":
+        """
+        Reads arrays written by save.
+        """
+        with np.load(path) as data:
+            return cls(data['player_ids'].astype(object), data['years'], data['careers'], data['lengths'],
+                       list(data['metrics']), int(data['horizon']))
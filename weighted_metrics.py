@@ -1,27 +1,69 @@
 import pandas as pd
+import numpy as np
 
-def calculate_weighted_averages(df: pd.DataFrame) -> pd.DataFrame:
+from data_loader import METRICS
+
+SEASON_WEIGHTS = {2023: 0.4, 2024: 0.6}
+
+GROUP_KEYS = ['player_id', 'last_name, first_name']
+
+
+def recency_weights(years: np.ndarray, season_weights: dict = None, half_life: float = None,
+                    n_seasons: int = None, latest_year: int = None) -> np.ndarray:
+    """
+    Weight of each row's season, zero for seasons that are not used.
+    Either season_weights maps seasons to explicit weights, or half_life (in seasons) decays each season's weight by half
+    for every half_life years before latest_year, optionally keeping only the last n_seasons seasons. latest_year is
+    one season or one per row (default: the latest season in years).
+    """
+    years = np.asarray(years)
+    if half_life is None:
+        season_weights = SEASON_WEIGHTS if season_weights is None else season_weights
+        return pd.Series(years).map(season_weights).fillna(0.0).to_numpy(dtype=np.float64)
+
+    latest_year = years.max() if latest_year is None and len(years) else latest_year
+    age = (latest_year - years).astype(np.float64)
+    weights = 0.5 ** (age / half_life)
+    used = age >= 0
+    if n_seasons is not None:
+        used &= age < n_seasons
+    return np.where(used, weights, 0.0)
+
+
+def calculate_weighted_averages(df: pd.DataFrame, season_weights: dict = None, half_life: float = None,
+                                n_seasons: int = None, latest_year: int = None, volume_column: str = None,
+                                metrics: list = METRICS) -> pd.DataFrame:
     """
-    Calculates weighted averages of offensive metrics for each breakout candidate,
-    prioritizing the most recent year (2024 > 2023). Accepts players with data in only one year.
+    Calculates weighted averages of offensive metrics for each breakout candidate, prioritizing the most recent seasons.
+    By default 2024 is weighted 0.6 and 2023 0.4; see recency_weights for explicit season weights and half-life decay.
+    Without latest_year, half-life decay is measured from each player's own last season.
+    volume_column (e.g. 'pa') also scales each season by its playing time, with a missing volume counting as zero.
+    Accepts players with data in only some of the weighted seasons; players with no weighted season are left out.
+    All metrics are averaged in one grouped pass over a (rows x 2*metrics) matrix of weighted values and weights.
     """
-    weights = {2023: 0.4, 2024: 0.6}
-    df = df[df['year'].isin(weights.keys())].copy()
-    df['weight'] = df['year'].map(weights)
+    if half_life is not None and latest_year is None:
+        latest_year = df.groupby(GROUP_KEYS, sort=False, observed=True)['year'].transform('max').to_numpy()
+    weights = recency_weights(df['year'].to_numpy(), season_weights, half_life, n_seasons, latest_year)
+    if volume_column is not None:
+        weights = weights * np.nan_to_num(df[volume_column].to_numpy(dtype=np.float64))
 
-    metrics = ['exit_velocity_avg', 'launch_angle_avg', 'barrel_batted_rate',
-               'hard_hit_percent', 'xwoba', 'xba', 'xslg']
+    df = df[weights > 0]
+    weights = weights[weights > 0]
+    if df.empty:
+        return pd.DataFrame(columns=GROUP_KEYS + list(metrics))
 
-    for metric in metrics:
-        df[f'{metric}_w'] = df[metric] * df['weight']
+    # Missing metric values drop out of both the numerator and that metric's total weight
+    values = df[metrics].to_numpy(dtype=np.float64)
+    present = ~np.isnan(values)
+    stacked = np.hstack([np.where(present, values, 0.0) * weights[:, None], present * weights[:, None]])
 
-    sum_weights = df.groupby(['player_id', 'last_name, first_name'])['weight'].sum().reset_index(name='total_weight')
-    weighted_sums = df.groupby(['player_id', 'last_name, first_name'])[[f'{m}_w' for m in metrics]].sum().reset_index()
+    codes = df.groupby(GROUP_KEYS, sort=True, observed=True).ngroup().to_numpy()
+    order = np.argsort(codes, kind='stable')
+    starts = np.flatnonzero(np.r_[True, np.diff(codes[order]) != 0])
+    sums = np.add.reduceat(stacked[order], starts, axis=0)
 
-    result = pd.merge(weighted_sums, sum_weights, on=['player_id', 'last_name, first_name'])
-    for metric in metrics:
-        result[metric] = result[f'{metric}_w'] / result['total_weight']
-        result.drop(columns=[f'{metric}_w'], inplace=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums[:, :len(metrics)] / sums[:, len(metrics):]
 
-    result.drop(columns=['total_weight'], inplace=True)
-    return result
+    result = df[GROUP_KEYS].iloc[order[starts]].reset_index(drop=True)
+    return pd.concat([result, pd.DataFrame(means, columns=metrics)], axis=1)